@@ -1,34 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from app.core.security import get_password_hash, verify_password, create_access_token, generate_verification_token
-from app.core.email import send_verification_email, send_password_reset_email, send_email_background, send_email_async
-from app.db.session import get_db
-from app.models.user import User
-from app.schemas.user import UserCreate, UserLogin, Token, UserVerify, PasswordReset, PasswordResetConfirm, UserResponse, RoleAssignment, GoogleAuth
+from app.core.security import averify_password, password_needs_rehash, create_access_token, decode_access_token
+from app.core.google import google_verifier
+from app.core.rate_limit import Limit, RateLimitExceeded, login_limiter, login_limits
+from app.core.revocation import revocation_list
+from app.core.tokens import (
+    InvalidUserToken, UserToken, VERIFY_EMAIL, RESET_PASSWORD,
+    create_verification_token, create_password_reset_token, verify_user_token,
+)
+from app.core.email import VERIFICATION_EMAIL, PASSWORD_RESET_EMAIL
+from app.db.pool import get_pool
+from app.db.session import get_db, get_read_db
+from app.db.routing import db_router
+from app.models.email_outbox import EmailOutbox
+from app.models.user import User, LISTABLE_COLUMNS
+from app.schemas.user import UserCreate, UserLogin, Token, UserVerify, PasswordReset, PasswordResetConfirm, UserResponse, RoleAssignment, GoogleAuth, UserBatchLookup, UserBatchLookupResponse, UserLookupResult
 from datetime import timedelta, datetime
 from app.core.config import settings
 import uuid
 import asyncpg
-from typing import AsyncGenerator
+from typing import AsyncGenerator, List, Optional, Tuple
 import logging
-from jose import JWTError, jwt
+from jose import JWTError
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
-from google.oauth2 import id_token
-from google.auth.transport import requests
 import secrets
+import asyncio
+import base64
+import binascii
+import json
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: asyncpg.Connection = Depends(get_db)
-) -> User:
+async def get_token_claims(
+    token: str = Depends(oauth2_scheme)
+) -> dict:
     """
-    Get the current authenticated user from the JWT token.
+    Verify the bearer token and return its claims.
+
+    Signature checks are cached per token until it expires; revocation is
+    checked on every request against the in-memory revocation list.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -38,28 +53,45 @@ async def get_current_user(
     
     try:
         logger.info("Attempting to decode JWT token")
-        # Decode the JWT token
-        payload = jwt.decode(
-            token,
-            settings.SECRET_KEY,
-            algorithms=[settings.ALGORITHM]
-        )
-        user_id: str = payload.get("sub")
-        if user_id is None:
+        payload = decode_access_token(token)
+        if payload.get("sub") is None:
             logger.warning("Token payload missing 'sub' claim")
             raise credentials_exception
-        logger.info(f"Successfully decoded token for user ID: {user_id}")
+        if revocation_list.is_revoked(payload.get("jti")):
+            logger.warning(f"Rejected revoked token for user ID: {payload['sub']}")
+            raise credentials_exception
+        logger.info(f"Successfully decoded token for user ID: {payload['sub']}")
+        return payload
+    except HTTPException:
+        raise
     except JWTError as jwt_error:
         logger.error(f"JWT decode error: {str(jwt_error)}", exc_info=True)
         raise credentials_exception
     except Exception as e:
         logger.error(f"Unexpected error during token validation: {str(e)}", exc_info=True)
         raise credentials_exception
+
+async def get_current_user(
+    claims: dict = Depends(get_token_claims)
+) -> User:
+    """
+    Get the current authenticated user from the JWT token.
+
+    Users are served from an in-process TTL cache; on a miss the row is read
+    from a replica unless they wrote recently (see app.db.routing), so only
+    the lookup itself holds a connection.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user_id: str = claims["sub"]
     
     try:
         # Get the user from the database
         logger.info(f"Fetching user from database with ID: {user_id}")
-        user = await User.get_by_id(db, UUID(user_id))
+        user = await User.get_by_id_cached(UUID(user_id))
         if user is None:
             logger.warning(f"No user found for ID: {user_id}")
             raise credentials_exception
@@ -69,6 +101,10 @@ async def get_current_user(
         logger.error(f"Error fetching user from database: {str(e)}", exc_info=True)
         raise credentials_exception
 
+def _token_claims(user: User) -> dict:
+    """Claims other services can authorize with without calling this API."""
+    return {"sub": str(user.id), "role": user.role, "email_verified": user.is_verified}
+
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_details(
     current_user: User = Depends(get_current_user)
@@ -106,16 +142,20 @@ async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
                 detail="Email already registered"
             )
         
-        # Create new user
+        # Create new user and queue the verification email in one transaction;
+        # the mailer worker sends it, so SMTP never delays or fails registration
         try:
-            new_user = await User.create(
-                db=db,
-                email=user.email,
-                first_name=user.first_name,
-                last_name=user.last_name,
-                password=user.password,
-                provider='email'  # Set provider to 'email' for email registration
-            )
+            async with db.transaction():
+                new_user = await User.create(
+                    db=db,
+                    email=user.email,
+                    first_name=user.first_name,
+                    last_name=user.last_name,
+                    password=user.password,
+                    provider='email'  # Set provider to 'email' for email registration
+                )
+                verification_token = create_verification_token(new_user.id, new_user.email)
+                await EmailOutbox.enqueue(db, [(VERIFICATION_EMAIL, new_user.email, {"token": verification_token})])
             logger.info(f"User created successfully with ID: {new_user.id}")
         except Exception as create_error:
             logger.error(f"Error creating user: {str(create_error)}", exc_info=True)
@@ -124,14 +164,9 @@ async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
                 detail=f"Failed to create user: {str(create_error)}"
             )
         
-        # Generate verification token
-        verification_token = generate_verification_token()
-        await User.update_verification_token(db, new_user.id, verification_token)
-        
-        # Send verification email
-        await send_verification_email(user.email, verification_token)
-        
         return {"message": "Registration successful. Please check your email to verify your account."}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Registration error: {str(e)}")
         raise HTTPException(
@@ -139,9 +174,44 @@ async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
             detail="Registration failed"
         )
 
+def _client_ip(request: Request) -> str:
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+async def throttle_login(request: Request, user_data: UserLogin) -> Limit:
+    """
+    Count a login attempt per client IP and per email, rejecting it with 429
+    before a database connection is leased or any password hashing is done.
+    Returns the per-email limit so a successful login can clear it.
+    """
+    limits = login_limits(_client_ip(request), user_data.email)
+    try:
+        await login_limiter.hit(limits)
+    except RateLimitExceeded as e:
+        logger.warning(f"Login throttled ({e.name}) for email {user_data.email}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, please try again later",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return limits[1]
+
+async def _upgrade_password_hash(user: User, password: str) -> None:
+    try:
+        async with get_pool().acquire() as conn:
+            if await user.upgrade_password_hash(conn, password):
+                logger.info(f"Upgraded password hash for user {user.id}")
+    except Exception as e:
+        logger.error(f"Failed to upgrade password hash for user {user.id}: {str(e)}")
+
 @router.post("/login", response_model=Token)
 async def login(
     user_data: UserLogin,
+    background_tasks: BackgroundTasks,
+    email_limit: Limit = Depends(throttle_login),
     db: asyncpg.Connection = Depends(get_db)
 ):
     """
@@ -170,7 +240,7 @@ async def login(
         
         # Verify password
         try:
-            password_valid = verify_password(user_data.password, user.hashed_password)
+            password_valid = await averify_password(user_data.password, user.hashed_password)
             logger.info(f"Password verification result for {user.email}: {password_valid}")
         except Exception as pwd_error:
             logger.error(f"Password verification error: {str(pwd_error)}", exc_info=True)
@@ -194,6 +264,13 @@ async def login(
                 detail="Please verify your email before logging in"
             )
         
+        # A successful login clears the failed attempts for this email
+        await login_limiter.reset(email_limit)
+
+        # Upgrade hashes made with an old scheme or cost after the response is sent
+        if password_needs_rehash(user.hashed_password):
+            background_tasks.add_task(_upgrade_password_hash, user, user_data.password)
+
         # Update last login time
         try:
             user.last_login = datetime.utcnow()
@@ -206,7 +283,7 @@ async def login(
         # Create access token
         try:
             access_token = create_access_token(
-                data={"sub": str(user.id)}
+                data=_token_claims(user)
             )
             logger.info(f"Access token created for user {user.email}")
         except Exception as token_error:
@@ -231,18 +308,38 @@ async def login(
             detail=f"An unexpected error occurred during login: {str(e)}"
         )
 
+def _check_user_token(token: str, purpose: str, detail: str) -> UserToken:
+    try:
+        return verify_user_token(token, purpose)
+    except InvalidUserToken as e:
+        logger.warning(f"Rejected {purpose} token: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+async def verification_token_claims(token: str) -> UserToken:
+    """Reject forged or expired links before a database connection is leased."""
+    return _check_user_token(token, VERIFY_EMAIL, "Invalid verification token")
+
+async def reset_token_claims(reset_data: PasswordResetConfirm) -> UserToken:
+    """Reject forged or expired links before a database connection is leased."""
+    return _check_user_token(reset_data.token, RESET_PASSWORD, "Invalid or expired reset token")
+
 @router.post("/verify-email/{token}", response_model=dict)
-async def verify_email(token: str, conn: asyncpg.Connection = Depends(get_db)):
-    user = await User.get_by_verification_token(conn, token)
-    if not user:
+async def verify_email(
+    claims: UserToken = Depends(verification_token_claims),
+    conn: asyncpg.Connection = Depends(get_db)
+):
+    user = await User.get_by_id(conn, claims.user_id)
+    # The token is tied to the address it was sent to
+    if not user or not claims.matches(user.email.lower()):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid verification token"
         )
+    if user.is_verified:
+        return {"message": "Email verified successfully"}
     
     user.is_verified = True
     user.is_active = True
-    user.verification_token = None
     await user.save(conn)
     
     return {"message": "Email verified successfully"}
@@ -258,19 +355,9 @@ async def forgot_password(
             # Don't reveal that the email doesn't exist
             return {"message": "If your email is registered, you will receive a password reset link"}
         
-        # Generate password reset token
-        reset_token = generate_verification_token()
-        user.reset_token = reset_token
-        await user.save(conn)
-        
-        # Send password reset email
-        try:
-            logger.info("Attempting to send password reset email")
-            await send_password_reset_email(user.email, reset_token)  # Added await here
-            logger.info("Password reset email sent successfully")
-        except Exception as email_error:
-            logger.error(f"Failed to send password reset email: {str(email_error)}")
-            # Don't raise an exception here, just log the error
+        # Signed with the current password hash, so the link stops working once used
+        reset_token = create_password_reset_token(user.id, user.hashed_password)
+        await EmailOutbox.enqueue(conn, [(PASSWORD_RESET_EMAIL, user.email, {"token": reset_token})])
         
         return {"message": "If your email is registered, you will receive a password reset link"}
     except Exception as e:
@@ -283,19 +370,18 @@ async def forgot_password(
 @router.post("/reset-password", response_model=dict)
 async def reset_password(
     reset_data: PasswordResetConfirm,
+    claims: UserToken = Depends(reset_token_claims),
     conn: asyncpg.Connection = Depends(get_db)
 ):
-    user = await User.get_by_reset_token(conn, reset_data.token)
-    if not user:
+    user = await User.get_by_id(conn, claims.user_id)
+    if not user or not claims.matches(user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or expired reset token"
         )
     
     # Update password
-    user.hashed_password = get_password_hash(reset_data.new_password)
-    user.reset_token = None
-    await user.save(conn)
+    await user.reset_password(conn, reset_data.new_password)
     
     return {"message": "Password has been reset successfully"}
 
@@ -316,21 +402,13 @@ async def resend_verification(
                 detail="Email is already verified"
             )
         
-        # Generate new verification token
-        verification_token = generate_verification_token()
-        user.verification_token = verification_token
-        await user.save(conn)
-        
-        # Send new verification email
-        try:
-            logger.info("Attempting to resend verification email")
-            send_verification_email(user.email, verification_token)  # Removed await
-            logger.info("Verification email resent successfully")
-        except Exception as email_error:
-            logger.error(f"Failed to resend verification email: {str(email_error)}")
-            # Don't raise an exception here, just log the error
+        # Queue a new verification email for the mailer
+        verification_token = create_verification_token(user.id, user.email)
+        await EmailOutbox.enqueue(conn, [(VERIFICATION_EMAIL, user.email, {"token": verification_token})])
         
         return {"message": "If your email is registered, you will receive a verification link"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in resend_verification: {str(e)}")
         raise HTTPException(
@@ -340,8 +418,9 @@ async def resend_verification(
 
 @router.post("/logout", response_model=dict)
 async def logout(
+    claims: dict = Depends(get_token_claims),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: asyncpg.Connection = Depends(get_db)
 ):
     """
     Logout endpoint that invalidates the current user's token.
@@ -349,9 +428,13 @@ async def logout(
     try:
         logger.info(f"User {current_user.email} logging out")
         
+        # Revoke the token; tokens issued before jti was added simply expire
+        if claims.get("jti"):
+            await revocation_list.revoke(db, claims["jti"], current_user.id, claims["exp"])
+        
         # Update the user's last logout time
         current_user.last_logout = datetime.utcnow()
-        db.commit()
+        await current_user.save(db)
         
         return {
             "message": "Successfully logged out",
@@ -407,6 +490,171 @@ async def assign_role(
             detail="Failed to assign role"
         )
 
+@router.post("/batch-lookup", response_model=UserBatchLookupResponse)
+async def batch_lookup(
+    lookup: UserBatchLookup,
+    db: asyncpg.Connection = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Resolve many users by ID and/or email in one query each. Only admin users can look up users."""
+    try:
+        if current_user.role != 'admin':
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only admin users can look up users"
+            )
+
+        users_by_id = await User.get_many_by_ids(db, lookup.ids)
+        users_by_email = await User.get_many_by_emails(db, lookup.emails)
+
+        results = [
+            UserLookupResult(
+                key=str(key),
+                found=user is not None,
+                user=UserResponse(
+                    id=user.id,
+                    email=user.email,
+                    first_name=user.first_name,
+                    last_name=user.last_name,
+                    is_verified=user.is_verified,
+                    is_active=user.is_active
+                ) if user else None
+            )
+            for key, user in zip(lookup.ids + lookup.emails, users_by_id + users_by_email)
+        ]
+        return UserBatchLookupResponse(results=results)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in batch lookup: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to look up users"
+        )
+
+def _encode_list_cursor(created_at: datetime, user_id: UUID) -> str:
+    """Opaque keyset cursor pointing just after the given row."""
+    raw = f"{created_at.isoformat()}|{user_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_list_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    created_at, user_id = raw.split("|")
+    return datetime.fromisoformat(created_at), UUID(user_id)
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+async def _stream_user_page(
+    conn: asyncpg.Connection,
+    columns: List[str],
+    limit: int,
+    **filters
+) -> AsyncGenerator[bytes, None]:
+    """
+    Write a page of users as JSON while rows arrive from the server-side cursor.
+
+    One extra row is requested to learn whether another page exists; it is
+    not emitted.
+    """
+    try:
+        yield b'{"items":['
+        count = 0
+        last = None
+        async with conn.transaction(readonly=True):
+            async for record in User.iter_page(
+                conn, columns, limit + 1, prefetch=settings.USER_LIST_CURSOR_PREFETCH, **filters
+            ):
+                count += 1
+                if count > limit:
+                    continue
+                item = json.dumps({column: record[column] for column in columns}, default=_json_default)
+                yield (item if count == 1 else "," + item).encode()
+                last = record
+        next_cursor = _encode_list_cursor(last['created_at'], last['id']) if count > limit else None
+        yield f'],"next_cursor":{json.dumps(next_cursor)}}}'.encode()
+    except Exception as e:
+        logger.error(f"Error streaming user list: {str(e)}", exc_info=True)
+        raise
+
+class _LeasedStreamingResponse(StreamingResponse):
+    """
+    Streams a body read from a leased connection and always hands the
+    connection back, also when the client disconnects before the body
+    starts and the generator never runs.
+    """
+
+    def __init__(self, content: AsyncGenerator[bytes, None], conn: asyncpg.Connection, pool, **kwargs):
+        super().__init__(content, **kwargs)
+        self._conn = conn
+        self._pool = pool
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Close the generator first so its transaction ends before the connection is reused
+            await self.body_iterator.aclose()
+            await self._pool.release(self._conn)
+
+@router.get("/")
+async def list_users(
+    limit: int = Query(settings.USER_LIST_DEFAULT_PAGE_SIZE, ge=1, le=settings.USER_LIST_MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="next_cursor returned by the previous page"),
+    role: Optional[str] = Query(None),
+    is_verified: Optional[bool] = Query(None),
+    provider: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="Comma-separated list of fields to return"),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    List users page by page. Only admin users can list users.
+
+    Returns {"items": [...], "next_cursor": ...}; pass next_cursor as `after`
+    to fetch the following page. The response is streamed.
+    """
+    if current_user.role != 'admin':
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only admin users can list users"
+        )
+
+    columns = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(LISTABLE_COLUMNS)
+    unknown = [c for c in columns if c not in LISTABLE_COLUMNS]
+    if unknown or not columns:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed fields: {', '.join(LISTABLE_COLUMNS)}"
+        )
+    try:
+        after_key = _decode_list_cursor(after) if after else None
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+    try:
+        conn, pool = await db_router.lease_read()
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is busy, please retry"
+        )
+    return _LeasedStreamingResponse(
+        _stream_user_page(
+            conn, list(dict.fromkeys(columns)), limit,
+            after=after_key, role=role, is_verified=is_verified, provider=provider
+        ),
+        conn,
+        pool,
+        media_type="application/json"
+    )
+
 @router.post("/google-auth", response_model=Token)
 async def google_auth(
     google_data: GoogleAuth,
@@ -416,19 +664,9 @@ async def google_auth(
     Authenticate or register a user using Google OAuth token.
     """
     try:
-        # Verify the Google token
+        # Verify the Google token (issuer, audience and signature)
         try:
-            idinfo = id_token.verify_oauth2_token(
-                google_data.token,
-                requests.Request(),
-                settings.GOOGLE_CLIENT_ID
-            )
-            
-            if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid token issuer"
-                )
+            idinfo = await google_verifier.verify(google_data.token)
             
             # Get user info from the token
             email = idinfo['email']
@@ -453,7 +691,7 @@ async def google_auth(
             
             # Create access token
             access_token = create_access_token(
-                data={"sub": str(existing_user.id)}
+                data=_token_claims(existing_user)
             )
             
             return {
@@ -478,7 +716,7 @@ async def google_auth(
             
             # Create access token
             access_token = create_access_token(
-                data={"sub": str(new_user.id)}
+                data=_token_claims(new_user)
             )
             
             return {
@@ -493,6 +731,8 @@ async def google_auth(
                 detail="Failed to create user"
             )
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Google authentication error: {str(e)}")
         raise HTTPException(
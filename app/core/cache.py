@@ -0,0 +1,113 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache whose entries also expire after `ttl` seconds.
+
+    Entries may carry their own TTL and a weight (e.g. an approximate size in
+    bytes); with `max_weight` set, least recently used entries are evicted
+    until the total weight fits as well as the entry count.
+
+    Not shared between worker processes: invalidation only reaches the local
+    copy, so the TTL bounds how stale another worker's entry can be.
+
+    `version` changes on every invalidation. A caller that reads from the
+    database on a miss should take the version before the read and pass it to
+    `set`; if the key was invalidated in between, the possibly stale value is
+    not cached.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, max_weight: Optional[int] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weight = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires, _ = entry
+        if expires <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        version: Optional[int] = None,
+        ttl: Optional[float] = None,
+        weight: int = 1,
+    ) -> None:
+        """Cache `value`; `ttl` overrides the cache-wide TTL for this entry."""
+        if not self.enabled or (version is not None and version != self.version):
+            return
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or (self.max_weight is not None and weight > self.max_weight):
+            return
+        self._remove(key)
+        self._entries[key] = (value, time.monotonic() + ttl, weight)
+        self.weight += weight
+        while len(self._entries) > self.maxsize or (
+            self.max_weight is not None and self.weight > self.max_weight
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: Hashable) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.weight -= entry[2]
+        return True
+
+    def invalidate(self, key: Hashable) -> None:
+        self.version += 1
+        if self._remove(key):
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self.version += 1
+        self._entries.clear()
+        self.weight = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "weight": self.weight,
+            "max_weight": self.max_weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
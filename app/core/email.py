@@ -1,12 +1,13 @@
-import smtplib
-import ssl
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.image import MIMEImage
+from email.utils import formataddr
 from app.core.config import settings
+from app.core.email_dispatcher import email_dispatcher
+from app.core.email_templates import LOGO_CID, fastapi_mail_env, get_email_template
+from app.core.smtp_pool import SMTPConnectionPool, smtp_pool
 import logging
-import asyncio
-from functools import partial
+from functools import lru_cache
 import aiosmtplib
 import os
 from fastapi import BackgroundTasks
@@ -27,8 +28,14 @@ class Envs:
     MAIL_SERVER = os.getenv('SMTP_HOST')
     MAIL_FROM_NAME = os.getenv('EMAILS_FROM_NAME')
 
+class _SharedTemplateConfig(ConnectionConfig):
+    """fastapi-mail builds a new Jinja environment per message; reuse one instead."""
+
+    def template_engine(self):
+        return fastapi_mail_env
+
 # Email configuration
-conf = ConnectionConfig(
+conf = _SharedTemplateConfig(
     MAIL_USERNAME=Envs.MAIL_USERNAME,
     MAIL_PASSWORD=Envs.MAIL_PASSWORD,
     MAIL_FROM=Envs.MAIL_FROM,
@@ -41,6 +48,7 @@ conf = ConnectionConfig(
     VALIDATE_CERTS=True,
     TEMPLATE_FOLDER=Path(__file__).parent.parent / 'templates' / 'email'
 )
+fast_mail = FastMail(conf)
 
 async def test_smtp_connection():
     """Test SMTP connection and authentication."""
@@ -74,127 +82,77 @@ async def test_smtp_connection():
         logger.error(f"SMTP connection test failed: {str(e)}")
         return False
 
-def create_verification_email(to_email: str, token: str) -> MIMEMultipart:
-    """Create a verification email."""
-    msg = MIMEMultipart('alternative')
-    msg['Subject'] = 'Welcome to Jesi AI - Verify Your Email'
-    msg['From'] = to_email
-    msg['To'] = to_email
+LOGO_PATH = Path(__file__).parent.parent / 'logo.png'
 
-    verification_url = f"{settings.FRONTEND_URL}/verify-email/{token}"
-    
-    html = f"""
-        <html>
-        <head>
-            <style>
-                body {{
-                    font-family: Arial, sans-serif;
-                    line-height: 1.6;
-                    color: #333333;
-                    max-width: 600px;
-                    margin: 0 auto;
-                    padding: 20px;
-                }}
-                .container {{
-                    background-color: #ffffff;
-                    border-radius: 8px;
-                    padding: 30px;
-                    box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1);
-                }}
-                .header {{
-                    text-align: center;
-                    margin-bottom: 30px;
-                }}
-                .logo {{
-                    max-width: 150px;
-                    height: auto;
-                    margin-bottom: 20px;
-                }}
-                .button {{
-                    display: inline-block;
-                    background-color: #FF7900;
-                    color: #ffffff;
-                    text-decoration: none;
-                    padding: 12px 24px;
-                    border-radius: 4px;
-                    margin: 20px 0;
-                }}
-                .footer {{
-                    margin-top: 30px;
-                    padding-top: 20px;
-                    border-top: 1px solid #eeeeee;
-                    font-size: 12px;
-                    color: #666666;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <img src="cid:logo" alt="Jesi AI Logo" class="logo">
-                    <h2>Welcome to Jesi AI!</h2>
-                </div>
-                
-                <p>Thank you for creating an account with Jesi AI. To get started, please verify your email address by clicking the button below:</p>
-                
-                <div style="text-align: center;">
-                    <a href="{verification_url}" class="button">Verify Email Address</a>
-                </div>
-                
-                <p>Or copy and paste this link into your browser:</p>
-                <p style="word-break: break-all; color: #666666;">{verification_url}</p>
-                
-                <p>If you did not create an account with Jesi AI, please ignore this email.</p>
-                
-                <div class="footer">
-                    <p>This is an automated message, please do not reply to this email.</p>
-                    <p>&copy; Jesi AI {settings.VERSION}</p>
-                </div>
-            </div>
-        </body>
-        </html>
-    """
-    
+class _SharedImagePart(MIMEImage):
+    """An image part attached to many messages; read-only once built."""
+
+    _frozen = False
+
+    def freeze(self) -> None:
+        self._frozen = True
+
+    def _check_mutable(self) -> None:
+        if self._frozen:
+            raise TypeError("Shared email asset parts are read-only")
+
+    def __setitem__(self, name, value):
+        self._check_mutable()
+        super().__setitem__(name, value)
+
+    def __delitem__(self, name):
+        self._check_mutable()
+        super().__delitem__(name)
+
+    def add_header(self, *args, **kwargs):
+        self._check_mutable()
+        super().add_header(*args, **kwargs)
+
+    def replace_header(self, *args, **kwargs):
+        self._check_mutable()
+        super().replace_header(*args, **kwargs)
+
+    def set_payload(self, *args, **kwargs):
+        self._check_mutable()
+        super().set_payload(*args, **kwargs)
+
+@lru_cache(maxsize=None)
+def get_logo_part() -> MIMEImage:
+    """The logo, read and base64-encoded once and attached to every message by reference."""
+    logo = _SharedImagePart(LOGO_PATH.read_bytes())
+    logo.add_header('Content-ID', f'<{LOGO_CID}>')
+    logo.add_header('Content-Disposition', 'inline', filename=LOGO_PATH.name)
+    logo.freeze()
+    return logo
+
+def _sender() -> str:
+    return formataddr((settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL or settings.SMTP_USER))
+
+def _build_message(subject: str, to_email: str, html: str) -> MIMEMultipart:
+    # An embedded logo travels with the HTML in multipart/related; a hosted
+    # one is just a link
+    msg = MIMEMultipart('alternative' if settings.EMAIL_LOGO_URL else 'related')
+    msg['Subject'] = subject
+    msg['From'] = _sender()
+    msg['To'] = to_email
     msg.attach(MIMEText(html, 'html'))
+    if not settings.EMAIL_LOGO_URL:
+        msg.attach(get_logo_part())
     return msg
 
+def create_verification_email(to_email: str, token: str) -> MIMEMultipart:
+    """Create a verification email."""
+    verification_url = f"{settings.FRONTEND_URL}/verify-email/{token}"
+    html = get_email_template('verification.html').render(verification_url=verification_url)
+    return _build_message('Welcome to Jesi AI - Verify Your Email', to_email, html)
+
 def send_email_sync(msg: MIMEMultipart) -> None:
-    """Send email synchronously."""
+    """Send email synchronously over a pooled SMTP session (SMTP_TRANSPORT=thread only)."""
+    if not isinstance(smtp_pool, SMTPConnectionPool):
+        raise RuntimeError("send_email_sync needs SMTP_TRANSPORT=thread; use email_dispatcher.send")
     try:
-        logger.info(f"Attempting to connect to SMTP server: {settings.SMTP_HOST}:{settings.SMTP_PORT}")
-        logger.info(f"Using SMTP user: {settings.SMTP_USER}")
-        
-        # Create SMTP connection
-        logger.info("Creating SMTP connection...")
-        server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT)
-        server.set_debuglevel(1)  # Enable debug output
-        
-        # Set ESMTP features for MailMug
-        server.esmtp_features["auth"] = "LOGIN DIGEST-MD5 PLAIN"
-        
-        # Only attempt STARTTLS if explicitly enabled
-        if settings.SMTP_TLS:
-            try:
-                logger.info("Attempting to enable STARTTLS...")
-                context = ssl.create_default_context()
-                server.starttls(context=context)
-                logger.info("STARTTLS enabled successfully")
-            except smtplib.SMTPNotSupportedError:
-                logger.warning("STARTTLS not supported by server, continuing without encryption")
-        
-        # Login to SMTP server
-        logger.info("Logging in to SMTP server...")
-        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-        
-        # Send email
-        logger.info("Sending email...")
-        server.send_message(msg)
+        smtp_pool.send_message(msg)
         logger.info("Email sent successfully")
-        
-        # Close connection
-        logger.info("Closing SMTP connection...")
-        server.quit()
-            
     except Exception as e:
         logger.error(f"Failed to send email: {str(e)}")
         raise
@@ -203,17 +161,8 @@ async def send_verification_email(to_email: str, token: str) -> None:
     """Send verification email asynchronously."""
     try:
         msg = create_verification_email(to_email, token)
-        # Attach logo
-        with open('app/logo.png', 'rb') as f:
-            logo = MIMEImage(f.read())
-            logo.add_header('Content-ID', '<logo>')
-            msg.attach(logo)
-
-        # Run the synchronous email sending in a thread pool
-        await asyncio.get_event_loop().run_in_executor(
-            None, 
-            partial(send_email_sync, msg)
-        )
+
+        await email_dispatcher.send(msg)
         logger.info(f"Verification email sent successfully to {to_email}")
     except Exception as e:
         logger.error(f"Failed to send verification email: {str(e)}")
@@ -221,120 +170,37 @@ async def send_verification_email(to_email: str, token: str) -> None:
 
 def create_password_reset_email(to_email: str, token: str) -> MIMEMultipart:
     """Create a password reset email."""
-    msg = MIMEMultipart('alternative')
-    msg['Subject'] = 'Reset Your Jesi AI Password'
-    msg['From'] = to_email
-    msg['To'] = to_email
-
     reset_url = f"{settings.FRONTEND_URL}/reset-password/{token}"
-    
-    html = f"""
-        <html>
-        <head>
-            <style>
-                body {{
-                    font-family: Arial, sans-serif;
-                    line-height: 1.6;
-                    color: #333333;
-                    max-width: 600px;
-                    margin: 0 auto;
-                    padding: 20px;
-                }}
-                .container {{
-                    background-color: #ffffff;
-                    border-radius: 8px;
-                    padding: 30px;
-                    box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1);
-                }}
-                .header {{
-                    text-align: center;
-                    margin-bottom: 30px;
-                }}
-                .logo {{
-                    max-width: 150px;
-                    height: auto;
-                    margin-bottom: 20px;
-                }}
-                .button {{
-                    display: inline-block;
-                    background-color: #FF7900;
-                    color: #ffffff;
-                    text-decoration: none;
-                    padding: 12px 24px;
-                    border-radius: 4px;
-                    margin: 20px 0;
-                }}
-                .warning {{
-                    background-color: #fff3cd;
-                    border: 1px solid #ffeeba;
-                    color: #856404;
-                    padding: 15px;
-                    border-radius: 4px;
-                    margin: 20px 0;
-                }}
-                .footer {{
-                    margin-top: 30px;
-                    padding-top: 20px;
-                    border-top: 1px solid #eeeeee;
-                    font-size: 12px;
-                    color: #666666;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <img src="cid:logo" alt="Jesi AI Logo" class="logo">
-                    <h2>Password Reset Request</h2>
-                </div>
-                
-                <p>We received a request to reset your password. Click the button below to create a new password:</p>
-                
-                <div style="text-align: center;">
-                    <a href="{reset_url}" class="button">Reset Password</a>
-                </div>
-                
-                <p>Or copy and paste this link into your browser:</p>
-                <p style="word-break: break-all; color: #666666;">{reset_url}</p>
-                
-                <div class="warning">
-                    <strong>Important:</strong> This link will expire in 1 hour for security reasons.
-                </div>
-                
-                <p>If you did not request a password reset, please ignore this email or contact support if you have concerns.</p>
-                
-                <div class="footer">
-                    <p>This is an automated message, please do not reply to this email.</p>
-                    <p>&copy; Jesi AI {settings.VERSION}</p>
-                </div>
-            </div>
-        </body>
-        </html>
-    """
-    
-    msg.attach(MIMEText(html, 'html'))
-    return msg
+    html = get_email_template('password_reset.html').render(reset_url=reset_url)
+    return _build_message('Reset Your Jesi AI Password', to_email, html)
 
 async def send_password_reset_email(to_email: str, token: str) -> None:
     """Send password reset email asynchronously."""
     try:
         msg = create_password_reset_email(to_email, token)
-        # Attach logo
-        with open('app/logo.png', 'rb') as f:
-            logo = MIMEImage(f.read())
-            logo.add_header('Content-ID', '<logo>')
-            msg.attach(logo)
-
-        # Run the synchronous email sending in a thread pool
-        await asyncio.get_event_loop().run_in_executor(
-            None, 
-            partial(send_email_sync, msg)
-        )
+
+        await email_dispatcher.send(msg)
         logger.info(f"Password reset email sent successfully to {to_email}")
     except Exception as e:
         logger.error(f"Failed to send password reset email: {str(e)}")
         raise
 
+# Kinds of email that can be queued in the outbox (app.models.email_outbox)
+VERIFICATION_EMAIL = 'verification'
+PASSWORD_RESET_EMAIL = 'password_reset'
+
+_OUTBOX_BUILDERS = {
+    VERIFICATION_EMAIL: create_verification_email,
+    PASSWORD_RESET_EMAIL: create_password_reset_email,
+}
+
+def build_outbox_email(kind: str, to_email: str, payload: dict) -> MIMEMultipart:
+    """Build the message for an outbox row; the payload carries the link token."""
+    builder = _OUTBOX_BUILDERS.get(kind)
+    if builder is None:
+        raise ValueError(f"Unknown email kind: {kind}")
+    return builder(to_email, payload['token'])
+
 async def send_email_async(subject: str, email_to: str, body: dict):
     """
     Send an email asynchronously.
@@ -352,10 +218,9 @@ async def send_email_async(subject: str, email_to: str, body: dict):
             subtype='html',
         )
         
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name='email.html')
+        await fast_mail.send_message(message, template_name='email.html')
     except Exception as e:
-        print(f"Error sending email: {str(e)}")
+        logger.error(f"Failed to send email to {email_to}: {str(e)}")
         raise
 
 def send_email_background(background_tasks: BackgroundTasks, subject: str, email_to: str, body: dict):
@@ -375,9 +240,8 @@ def send_email_background(background_tasks: BackgroundTasks, subject: str, email
             body=body,
             subtype='html',
         )
-        fm = FastMail(conf)
         background_tasks.add_task(
-            fm.send_message, message, template_name='email.html')
+            fast_mail.send_message, message, template_name='email.html')
     except Exception as e:
-        print(f"Error sending email: {str(e)}")
+        logger.error(f"Failed to send email to {email_to}: {str(e)}")
         raise 
\ No newline at end of file
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import Message
+from typing import List, Optional, Set, Tuple, Union
+from app.core.config import settings
+from app.core.smtp_pool import AsyncSMTPConnectionPool, SMTPConnectionPool, smtp_pool
+
+logger = logging.getLogger(__name__)
+
+
+class EmailDispatcher:
+    """
+    Collects outgoing messages and sends them in batches, one SMTP session
+    per batch.
+
+    `send` queues a message and waits for its result. A batch is cut when
+    `max_batch` messages are waiting or `flush_interval` seconds after the
+    first one arrived, whichever comes first, and is sent with
+    the pool's `send_many`. With the blocking pool, batches run on a private
+    thread pool with one thread per SMTP session, so mail never ties up the
+    default executor; the asyncio pool sends them on the event loop. While
+    all sessions are busy, further batches wait their turn.
+    """
+
+    def __init__(
+        self,
+        pool: Union[SMTPConnectionPool, AsyncSMTPConnectionPool],
+        max_batch: int,
+        flush_interval: float,
+    ):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending: List[Tuple[Message, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight: Set[asyncio.Task] = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.batches = 0
+        self.messages = 0
+        self.failed = 0
+        self.largest_batch = 0
+        self.send_seconds = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool.size, thread_name_prefix="email")
+        return self._executor
+
+    async def send(self, msg: Message) -> None:
+        """Queue a message for the next batch; returns once it is sent and raises if it failed."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((msg, future))
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.flush_interval, self.flush)
+        await future
+
+    def flush(self) -> None:
+        """Send everything queued so far as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._send_batch(batch))
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+
+    async def _send_batch(self, batch: List[Tuple[Message, asyncio.Future]]) -> None:
+        messages = [msg for msg, _ in batch]
+        started = time.perf_counter()
+        try:
+            if isinstance(self.pool, AsyncSMTPConnectionPool):
+                results = await self.pool.send_many(messages)
+            else:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self._get_executor(), self.pool.send_many, messages
+                )
+        except Exception as e:
+            results = [e] * len(batch)
+        self.send_seconds += time.perf_counter() - started
+        self.batches += 1
+        self.messages += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for (_, future), error in zip(batch, results):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                self.failed += 1
+                future.set_exception(error)
+
+    async def close(self) -> None:
+        """Send what is queued, wait for batches in flight and stop the sender threads."""
+        self.flush()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "messages": self.messages,
+            "failed": self.failed,
+            "queued": len(self._pending),
+            "average_batch": round(self.messages / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            # Throughput of one SMTP session; batches on separate sessions overlap
+            "messages_per_session_second": round(self.messages / self.send_seconds, 1) if self.send_seconds else 0.0,
+        }
+
+
+email_dispatcher = EmailDispatcher(
+    smtp_pool,
+    max_batch=settings.EMAIL_BATCH_MAX_MESSAGES,
+    flush_interval=settings.EMAIL_BATCH_FLUSH_MS / 1000,
+)
@@ -0,0 +1,95 @@
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Sequence, Tuple
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
+from markupsafe import Markup, escape
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_DIR = Path(__file__).parent.parent / 'templates' / 'email'
+
+# One environment for the whole process: templates are compiled on first use
+# and kept, and never re-read from disk
+template_env = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=select_autoescape(['html']),
+    auto_reload=False,
+)
+
+# Templates sent through fastapi-mail keep its own settings (no autoescaping;
+# they mark trusted HTML with |safe themselves), but the environment is
+# likewise built once instead of per message
+fastapi_mail_env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), auto_reload=False)
+
+# Embedded logo part (see app.core.email.get_logo_part), or the hosted image
+LOGO_CID = "logo"
+
+# Templates rendered per recipient, with the variables that change per message
+EMAIL_TEMPLATES: Dict[str, Tuple[str, ...]] = {
+    'verification.html': ('verification_url',),
+    'password_reset.html': ('reset_url',),
+}
+
+_MARKER = "\x00"
+
+
+def logo_src() -> str:
+    return settings.EMAIL_LOGO_URL or f"cid:{LOGO_CID}"
+
+
+template_env.globals['logo_src'] = logo_src()
+fastapi_mail_env.globals['logo_src'] = logo_src()
+
+
+def _static_context() -> dict:
+    return {
+        'logo_src': logo_src(),
+        'version': settings.VERSION,
+        'reset_expire_minutes': settings.PASSWORD_RESET_TOKEN_EXPIRE_MINUTES,
+    }
+
+
+class PrecompiledTemplate:
+    """
+    A template rendered once with everything but its per-recipient variables.
+
+    The template is rendered with a marker in place of each variable and
+    split around the markers; `render` only escapes the values and joins
+    them with the pre-rendered fragments. Variables must be output as plain
+    `{{ name }}` (no filters), which is all the email templates need.
+    """
+
+    def __init__(self, template: Template, static: dict, variables: Sequence[str]):
+        markers = {name: Markup(f"{_MARKER}{name}{_MARKER}") for name in variables}
+        parts = template.render(**static, **markers).split(_MARKER)
+        self.variables = frozenset(variables)
+        self._fragments = parts[0::2]
+        self._slots = parts[1::2]
+        unknown = set(self._slots) - self.variables
+        if unknown:
+            raise ValueError(f"Template {template.name} has unexpected markers: {unknown}")
+
+    def render(self, **values) -> str:
+        missing = self.variables - values.keys()
+        if missing:
+            raise ValueError(f"Missing template variables: {', '.join(sorted(missing))}")
+        escaped = {name: escape(values[name]) for name in self.variables}
+        out = [self._fragments[0]]
+        for slot, fragment in zip(self._slots, self._fragments[1:]):
+            out.append(escaped[slot])
+            out.append(fragment)
+        return "".join(out)
+
+
+@lru_cache(maxsize=None)
+def get_email_template(name: str) -> PrecompiledTemplate:
+    return PrecompiledTemplate(template_env.get_template(name), _static_context(), EMAIL_TEMPLATES[name])
+
+
+def load_email_templates() -> None:
+    """Compile and pre-render every email template, so the first send doesn't pay for it."""
+    for name in EMAIL_TEMPLATES:
+        get_email_template(name)
+    logger.info(f"Loaded {len(EMAIL_TEMPLATES)} email templates")
@@ -0,0 +1,143 @@
+import asyncio
+import base64
+import json
+import logging
+import re
+import time
+from typing import Dict, Optional
+import httpx
+from google.auth import exceptions as google_exceptions
+from google.auth import jwt as google_jwt
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+class GoogleTokenVerifier:
+    """
+    Verifies Google ID tokens against Google's signing certificates.
+
+    The certificates are fetched over a pooled async HTTP client and cached
+    until their Cache-Control max-age runs out, so the common case is pure
+    local crypto. Concurrent requests share one refresh, and a token signed
+    with a kid we don't know yet triggers an early refresh (Google rotated
+    its keys). Signature checks run in the default executor, off the event
+    loop.
+    """
+
+    # Forced refreshes for unknown kids are limited so junk tokens can't
+    # make us hammer the certificate endpoint
+    MIN_REFRESH_INTERVAL = 30
+
+    def __init__(self, certs_url: str, client_id: str, default_max_age: float = 300):
+        self.certs_url = certs_url
+        self.client_id = client_id
+        self.default_max_age = default_max_age
+        self._certs: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._fetched_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self._client: Optional[httpx.AsyncClient] = None
+        self.cert_fetches = 0
+        self.cert_fetch_errors = 0
+        self.verifications = 0
+        self.failures = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=settings.GOOGLE_CERTS_TIMEOUT)
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get_certs(self, refresh: bool = False) -> Dict[str, str]:
+        """Cached certificates by kid; `refresh` fetches them unless another request just did."""
+        now = time.monotonic()
+        if self._certs and (
+            now < self._expires_at if not refresh else now - self._fetched_at < self.MIN_REFRESH_INTERVAL
+        ):
+            return self._certs
+        fetches = self.cert_fetches
+        async with self._lock:
+            if self.cert_fetches != fetches and self._certs:
+                return self._certs
+            if not refresh and self._certs and time.monotonic() < self._expires_at:
+                return self._certs
+            await self._fetch_certs()
+        return self._certs
+
+    async def _fetch_certs(self) -> None:
+        try:
+            response = await self._get_client().get(self.certs_url)
+            response.raise_for_status()
+            certs = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            self.cert_fetch_errors += 1
+            logger.error(f"Failed to fetch Google certificates: {str(e)}")
+            if self._certs:
+                # Keep verifying with the certificates we have; retry shortly
+                self._expires_at = time.monotonic() + min(self.default_max_age, 60)
+                return
+            raise ValueError(f"Could not fetch Google certificates: {str(e)}")
+        match = _MAX_AGE.search(response.headers.get("cache-control", ""))
+        max_age = int(match.group(1)) if match else self.default_max_age
+        self._certs = certs
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + max_age
+        self.cert_fetches += 1
+        logger.info(f"Fetched {len(certs)} Google certificates, cached for {max_age}s")
+
+    @staticmethod
+    def _token_kid(token: str) -> Optional[str]:
+        try:
+            header = token.split(".", 1)[0]
+            header += "=" * (-len(header) % 4)
+            return json.loads(base64.urlsafe_b64decode(header)).get("kid")
+        except (ValueError, AttributeError):
+            raise ValueError("Malformed token")
+
+    def _decode(self, token: str, certs: Dict[str, str]) -> dict:
+        try:
+            idinfo = google_jwt.decode(token, certs=certs, audience=self.client_id)
+        except google_exceptions.GoogleAuthError as e:
+            raise ValueError(str(e))
+        if idinfo.get("iss") not in GOOGLE_ISSUERS:
+            raise ValueError(f"Wrong issuer: {idinfo.get('iss')}")
+        return idinfo
+
+    async def verify(self, token: str) -> dict:
+        """Return the token's claims; raises ValueError if it is not a valid Google ID token."""
+        try:
+            if not self.client_id:
+                raise ValueError("Google sign-in is not configured (GOOGLE_CLIENT_ID is empty)")
+            kid = self._token_kid(token)
+            certs = await self.get_certs()
+            if kid not in certs:
+                certs = await self.get_certs(refresh=True)
+            loop = asyncio.get_running_loop()
+            idinfo = await loop.run_in_executor(None, self._decode, token, certs)
+        except ValueError:
+            self.failures += 1
+            raise
+        self.verifications += 1
+        return idinfo
+
+    def stats(self) -> dict:
+        return {
+            "cached_certs": len(self._certs),
+            "certs_expire_in": max(round(self._expires_at - time.monotonic(), 1), 0.0),
+            "cert_fetches": self.cert_fetches,
+            "cert_fetch_errors": self.cert_fetch_errors,
+            "verifications": self.verifications,
+            "failures": self.failures,
+        }
+
+
+google_verifier = GoogleTokenVerifier(settings.GOOGLE_CERTS_URL, settings.GOOGLE_CLIENT_ID)
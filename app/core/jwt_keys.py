@@ -0,0 +1,100 @@
+import hashlib
+import json
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+from jose import JWTError, jwk
+from jose.backends.base import Key
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Algorithms signed with a private key and verifiable from the published JWKS
+ASYMMETRIC_ALGORITHMS = ("RS256", "ES256")
+
+
+class SigningKey(NamedTuple):
+    kid: str
+    algorithm: str
+    private_key: Optional[Key]
+    public_key: Key
+    public_jwk: dict
+
+
+class KeyRing:
+    """
+    Keys for asymmetric access tokens.
+
+    Tokens are signed with the active key and carry its `kid`; every key in
+    the ring is published in the JWKS and accepted for verification. To
+    rotate, add the new key and restart so it is published, switch
+    JWT_SIGNING_KID once downstream JWKS caches have refreshed, and remove
+    the old key after the longest token lifetime has passed.
+    """
+
+    def __init__(self, algorithm: str, keys: Dict[str, SigningKey], active_kid: str):
+        if active_kid not in keys or keys[active_kid].private_key is None:
+            raise RuntimeError(f"No private key for JWT signing key id '{active_kid}'")
+        self.algorithm = algorithm
+        self.keys = keys
+        self.active_kid = active_kid
+        self.jwks_body = json.dumps(
+            {"keys": [key.public_jwk for key in keys.values()]},
+            sort_keys=True,
+            separators=(",", ":"),
+        ).encode()
+        self.jwks_etag = '"' + hashlib.sha256(self.jwks_body).hexdigest()[:32] + '"'
+
+    @classmethod
+    def from_directory(cls, path: str, algorithm: str, active_kid: str = "") -> "KeyRing":
+        """
+        Load `<kid>.pem` files from `path`.
+
+        Files holding a private key can sign; public-only files are kept for
+        verifying tokens from retired keys. Without an explicit `active_kid`
+        the only private key signs; with several, `active_kid` is required,
+        so adding a key never changes the signing key by itself.
+        """
+        keys = {}
+        for pem_path in sorted(Path(path).glob("*.pem")):
+            kid = pem_path.stem
+            pem = pem_path.read_text()
+            try:
+                key = jwk.construct(pem, algorithm)
+            except JWTError as e:
+                raise RuntimeError(f"Invalid {algorithm} key in {pem_path}: {str(e)}")
+            public_key = key.public_key()
+            public_jwk = public_key.to_dict()
+            public_jwk.update({"kid": kid, "use": "sig", "alg": algorithm})
+            private_key = key if "PRIVATE KEY" in pem else None
+            keys[kid] = SigningKey(kid, algorithm, private_key, public_key, public_jwk)
+        if not keys:
+            raise RuntimeError(f"No JWT keys found in {path}")
+        if not active_kid:
+            private = [kid for kid, key in keys.items() if key.private_key is not None]
+            if len(private) > 1:
+                raise RuntimeError(
+                    f"Several private JWT keys in {path} ({', '.join(private)}); "
+                    f"set JWT_SIGNING_KID to the one that signs"
+                )
+            active_kid = private[0] if private else ""
+        logger.info(f"Loaded {len(keys)} JWT keys from {path}, signing with '{active_kid}'")
+        return cls(algorithm, keys, active_kid)
+
+    def signing_key(self) -> SigningKey:
+        return self.keys[self.active_kid]
+
+    def verification_key(self, kid: Optional[str]) -> Key:
+        key = self.keys.get(kid) if kid else None
+        if key is None:
+            raise JWTError(f"Unknown signing key id: {kid}")
+        return key.public_key
+
+
+@lru_cache(maxsize=None)
+def get_key_ring() -> Optional[KeyRing]:
+    """The configured key ring, or None when tokens use the shared SECRET_KEY."""
+    if settings.ALGORITHM not in ASYMMETRIC_ALGORITHMS:
+        return None
+    return KeyRing.from_directory(settings.JWT_KEYS_DIR, settings.ALGORITHM, settings.JWT_SIGNING_KID)
@@ -0,0 +1,188 @@
+import logging
+import math
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """Per-process counters with expiry; limits are per worker process."""
+
+    # Expired counters are swept after this many increments
+    SWEEP_EVERY = 10_000
+
+    def __init__(self):
+        self._counters: Dict[str, Tuple[int, float]] = {}
+        self._writes = 0
+
+    async def get_many(self, keys: Sequence[str]) -> List[int]:
+        now = time.monotonic()
+        counts = []
+        for key in keys:
+            entry = self._counters.get(key)
+            counts.append(entry[0] if entry is not None and entry[1] > now else 0)
+        return counts
+
+    async def incr(self, key: str, ttl: float) -> int:
+        now = time.monotonic()
+        count, expires = self._counters.get(key, (0, 0.0))
+        if expires <= now:
+            count, expires = 0, now + ttl
+        self._counters[key] = (count + 1, expires)
+        self._writes += 1
+        if self._writes % self.SWEEP_EVERY == 0:
+            self._sweep(now)
+        return count + 1
+
+    async def delete(self, key: str) -> None:
+        self._counters.pop(key, None)
+
+    def _sweep(self, now: float) -> None:
+        for key in [key for key, (_, expires) in self._counters.items() if expires <= now]:
+            del self._counters[key]
+
+
+class RedisBackend:
+    """
+    Counters shared by all workers, in Redis or anything speaking the same
+    commands. `client` needs async `mget`, `incr`, `expire` and `delete`
+    (redis.asyncio.Redis does; so does a local stand-in in tests).
+    """
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get_many(self, keys: Sequence[str]) -> List[int]:
+        values = await self.client.mget([self.prefix + key for key in keys])
+        return [int(value) if value is not None else 0 for value in values]
+
+    async def incr(self, key: str, ttl: float) -> int:
+        count = await self.client.incr(self.prefix + key)
+        if count == 1:
+            await self.client.expire(self.prefix + key, math.ceil(ttl))
+        return count
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+
+class Limit(NamedTuple):
+    name: str
+    key: str
+    limit: int
+    window: float
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"Rate limit '{name}' exceeded, retry after {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """
+    Sliding-window rate limiter.
+
+    Each limit keeps a counter per fixed window; the rate is the current
+    window's count plus the previous window's count weighted by how much of
+    it still overlaps the sliding window. That needs only two counters per
+    key, which keeps the shared backend to plain INCR/EXPIRE.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.allowed = 0
+        self.throttled: Dict[str, int] = {}
+        self.backend_errors = 0
+
+    @staticmethod
+    def _window_keys(limit: Limit, now: float) -> Tuple[str, str, float]:
+        index = int(now // limit.window)
+        elapsed = (now - index * limit.window) / limit.window
+        return f"{limit.name}:{limit.key}:{index}", f"{limit.name}:{limit.key}:{index - 1}", elapsed
+
+    async def hit(self, limits: Sequence[Limit], now: Optional[float] = None) -> None:
+        """
+        Count one attempt against every limit, or raise RateLimitExceeded
+        without counting it if any limit is already used up.
+
+        Backend failures let the attempt through (and are counted), so an
+        outage of the shared store doesn't lock everyone out.
+        """
+        now = time.time() if now is None else now
+        try:
+            windows = [self._window_keys(limit, now) for limit in limits]
+            counts = await self.backend.get_many([key for current, previous, _ in windows for key in (current, previous)])
+            for i, (limit, (_, _, elapsed)) in enumerate(zip(limits, windows)):
+                current, previous = counts[2 * i], counts[2 * i + 1]
+                rate = previous * (1 - elapsed) + current
+                if rate >= limit.limit:
+                    self.throttled[limit.name] = self.throttled.get(limit.name, 0) + 1
+                    raise RateLimitExceeded(limit.name, self._retry_after(limit, current, previous, elapsed))
+            for limit, (current_key, _, _) in zip(limits, windows):
+                await self.backend.incr(current_key, 2 * limit.window)
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            self.backend_errors += 1
+            logger.error(f"Rate limit backend error, allowing request: {str(e)}")
+        self.allowed += 1
+
+    @staticmethod
+    def _retry_after(limit: Limit, current: int, previous: int, elapsed: float) -> int:
+        # Seconds until the weighted previous window has decayed enough,
+        # or until the current window rolls over if it is full on its own
+        remaining = (1 - elapsed) * limit.window
+        if current < limit.limit and previous:
+            decay = (previous * (1 - elapsed) + current - limit.limit) / previous * limit.window
+            remaining = min(remaining, decay)
+        elif current >= limit.limit:
+            # After the rollover this window's count still weighs in until it
+            # has decayed below the limit
+            remaining += (1 - limit.limit / current) * limit.window
+        return max(1, math.ceil(remaining))
+
+    async def reset(self, limit: Limit, now: Optional[float] = None) -> None:
+        """Forget attempts for one key, e.g. after a successful login."""
+        now = time.time() if now is None else now
+        current, previous, _ = self._window_keys(limit, now)
+        try:
+            await self.backend.delete(current)
+            await self.backend.delete(previous)
+        except Exception as e:
+            self.backend_errors += 1
+            logger.error(f"Rate limit backend error on reset: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "allowed": self.allowed,
+            "throttled": dict(self.throttled),
+            "backend_errors": self.backend_errors,
+        }
+
+
+def create_backend():
+    """Redis backend when RATE_LIMIT_REDIS_URL is set, otherwise in-memory."""
+    if not settings.RATE_LIMIT_REDIS_URL:
+        return MemoryBackend()
+    try:
+        import redis.asyncio as redis
+    except ImportError:
+        raise RuntimeError("RATE_LIMIT_REDIS_URL is set but the 'redis' package is not installed")
+    return RedisBackend(redis.from_url(settings.RATE_LIMIT_REDIS_URL))
+
+
+def login_limits(client_ip: str, email: str) -> List[Limit]:
+    """The per-IP and per-email limits for a login attempt, in that order."""
+    window = settings.LOGIN_RATE_LIMIT_WINDOW_SECONDS
+    return [
+        Limit("login_ip", client_ip, settings.LOGIN_RATE_LIMIT_PER_IP, window),
+        Limit("login_email", email.lower(), settings.LOGIN_RATE_LIMIT_PER_EMAIL, window),
+    ]
+
+
+login_limiter = RateLimiter(create_backend())
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from app.core.config import settings
+from app.db.pool import get_pool
+from app.models.revoked_token import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationList:
+    """
+    In-memory copy of the revoked_tokens table for the request hot path.
+
+    An expiring set: jti -> token exp (epoch seconds). `is_revoked` is a
+    single dict lookup, and entries are dropped once the token would have
+    expired anyway. A background task pulls revocations recorded since the
+    last refresh (with some overlap for late commits), so revocations made by
+    other worker processes take effect within REVOCATION_REFRESH_SECONDS;
+    revocations made by this process take effect immediately.
+    """
+
+    # Re-read this far behind the newest revocation seen, so rows whose
+    # transaction committed after a later-stamped row are not missed
+    REFRESH_OVERLAP = timedelta(seconds=30)
+    # How often expired rows are deleted from the table
+    PURGE_INTERVAL = 3600
+
+    def __init__(self):
+        self._revoked: Dict[str, float] = {}
+        self._last_revoked_at: Optional[datetime] = None
+        self._last_purge = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.rejected = 0
+
+    def add(self, jti: str, exp: float) -> None:
+        if exp > time.time():
+            self._revoked[jti] = exp
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        if jti is None:
+            return False
+        exp = self._revoked.get(jti)
+        if exp is None:
+            return False
+        if exp <= time.time():
+            self._revoked.pop(jti, None)
+            return False
+        self.rejected += 1
+        return True
+
+    def _drop_expired(self) -> None:
+        now = time.time()
+        for jti in [jti for jti, exp in self._revoked.items() if exp <= now]:
+            del self._revoked[jti]
+
+    async def revoke(self, db, jti: str, user_id, exp: float) -> None:
+        """Persist a revocation and apply it to this process right away."""
+        expires_at = datetime.fromtimestamp(exp, tz=timezone.utc)
+        await RevokedToken.revoke(db, jti, user_id, expires_at)
+        self.add(jti, exp)
+
+    async def refresh(self) -> None:
+        """Load revocations recorded since the last refresh (all unexpired ones the first time)."""
+        since = None if self._last_revoked_at is None else self._last_revoked_at - self.REFRESH_OVERLAP
+        async with get_pool().acquire() as conn:
+            rows = await RevokedToken.get_revoked(conn, since)
+            if time.monotonic() - self._last_purge > self.PURGE_INTERVAL:
+                self._last_purge = time.monotonic()
+                deleted = await RevokedToken.delete_expired(conn)
+                if deleted:
+                    logger.info(f"Deleted {deleted} expired token revocations")
+        for row in rows:
+            self.add(row['jti'], row['expires_at'].timestamp())
+            if self._last_revoked_at is None or row['revoked_at'] > self._last_revoked_at:
+                self._last_revoked_at = row['revoked_at']
+        self._drop_expired()
+        self.refreshes += 1
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.REVOCATION_REFRESH_SECONDS)
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.refresh_errors += 1
+                logger.error(f"Error refreshing token revocations: {str(e)}")
+
+    async def start(self) -> None:
+        """Load the current revocations and keep them refreshed in the background."""
+        await self.refresh()
+        logger.info(f"Loaded {len(self._revoked)} token revocations")
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "revoked_tokens": len(self._revoked),
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "rejected_requests": self.rejected,
+        }
+
+
+revocation_list = RevocationList()
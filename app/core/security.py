@@ -1,20 +1,49 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.jwt_keys import get_key_ring
+import asyncio
+import hashlib
+import multiprocessing
+import time
 import uuid
-import secrets
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Schemes passwords can be verified with. New hashes use PASSWORD_HASH_SCHEME;
+# hashes made with the other scheme or with a different cost still verify and
+# are reported by `password_needs_rehash` so login can upgrade them.
+PASSWORD_HASH_SCHEMES = ("bcrypt", "argon2")
+
+def build_pwd_context(
+    scheme: str = settings.PASSWORD_HASH_SCHEME,
+    bcrypt_rounds: int = settings.BCRYPT_ROUNDS,
+    argon2_time_cost: int = settings.ARGON2_TIME_COST,
+    argon2_memory_cost: int = settings.ARGON2_MEMORY_COST,
+    argon2_parallelism: int = settings.ARGON2_PARALLELISM,
+) -> CryptContext:
+    """Build the password CryptContext for a scheme and cost."""
+    if scheme not in PASSWORD_HASH_SCHEMES:
+        raise ValueError(f"Unsupported password hash scheme '{scheme}', expected one of {PASSWORD_HASH_SCHEMES}")
+    return CryptContext(
+        schemes=list(PASSWORD_HASH_SCHEMES),
+        default=scheme,
+        deprecated="auto",
+        bcrypt__rounds=bcrypt_rounds,
+        argon2__type="ID",
+        argon2__time_cost=argon2_time_cost,
+        argon2__memory_cost=argon2_memory_cost,
+        argon2__parallelism=argon2_parallelism,
+    )
+
 # Password hashing
-pwd_context = CryptContext(
-    schemes=["bcrypt"],
-    deprecated="auto",
-    bcrypt__rounds=12  # Set consistent rounds
-)
+pwd_context = build_pwd_context()
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
@@ -32,6 +61,129 @@ def get_password_hash(password: str) -> str:
         logger.error(f"Error hashing password: {str(e)}")
         raise
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Whether a hash uses an old scheme or cost and should be replaced."""
+    try:
+        return pwd_context.needs_update(hashed_password)
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error checking password hash: {str(e)}")
+        return False
+
+class HashPoolStats:
+    """Queue depth and latency counters for the password hashing pool."""
+
+    __slots__ = ('submitted', 'completed', 'errors', 'pending', 'max_pending',
+                 'total_wait_seconds', 'total_run_seconds', 'max_seconds')
+
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.errors = 0
+        self.pending = 0
+        self.max_pending = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        done = self.completed or 1
+        return {
+            "workers": settings.PASSWORD_HASH_WORKERS,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "errors": self.errors,
+            "queue_depth": self.pending,
+            "max_queue_depth": self.max_pending,
+            "avg_wait_ms": round(self.total_wait_seconds * 1000 / done, 3),
+            "avg_run_ms": round(self.total_run_seconds * 1000 / done, 3),
+            "max_ms": round(self.max_seconds * 1000, 3),
+        }
+
+# Password hashing runs in worker processes so bcrypt never blocks the event
+# loop. Workers are spawned rather than forked: the API process has a running
+# event loop and pool threads that must not be copied into the children.
+_hash_executor: Optional[ProcessPoolExecutor] = None
+_hash_stats = HashPoolStats()
+
+def _timed(func: Callable, *args) -> Tuple[object, float]:
+    """Run `func` in a worker and report how long the call itself took."""
+    started = time.perf_counter()
+    return func(*args), time.perf_counter() - started
+
+def _get_hash_executor() -> ProcessPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        logger.info(f"Password hashing pool started with {settings.PASSWORD_HASH_WORKERS} workers")
+    return _hash_executor
+
+def _reset_hash_executor(broken: ProcessPoolExecutor) -> None:
+    global _hash_executor
+    if _hash_executor is broken:
+        logger.error("Password hashing pool is broken, restarting it")
+        _hash_executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+async def _run_in_hash_pool(func: Callable, *args):
+    stats = _hash_stats
+    stats.submitted += 1
+    stats.pending += 1
+    if stats.pending > stats.max_pending:
+        stats.max_pending = stats.pending
+    started = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        executor = _get_hash_executor()
+        result, run_seconds = await loop.run_in_executor(executor, _timed, func, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); start a fresh pool for later calls
+        stats.errors += 1
+        _reset_hash_executor(executor)
+        raise
+    except Exception:
+        stats.errors += 1
+        raise
+    finally:
+        stats.pending -= 1
+    elapsed = time.perf_counter() - started
+    stats.completed += 1
+    stats.total_run_seconds += run_seconds
+    stats.total_wait_seconds += max(elapsed - run_seconds, 0.0)
+    if elapsed > stats.max_seconds:
+        stats.max_seconds = elapsed
+    return result
+
+async def averify_password(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash in the password hashing pool."""
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+async def aget_password_hash(password: str) -> str:
+    """Generate a password hash in the password hashing pool."""
+    return await _run_in_hash_pool(get_password_hash, password)
+
+async def start_hash_pool() -> None:
+    """Spawn the hashing workers up front so the first logins don't pay for it."""
+    loop = asyncio.get_running_loop()
+    executor = _get_hash_executor()
+    await asyncio.gather(*(
+        loop.run_in_executor(executor, _timed, len, "")
+        for _ in range(settings.PASSWORD_HASH_WORKERS)
+    ))
+
+def get_hash_pool_stats() -> dict:
+    return _hash_stats.as_dict()
+
+def shutdown_hash_pool() -> None:
+    """Stop the password hashing workers."""
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=True, cancel_futures=True)
+        _hash_executor = None
+        logger.info("Password hashing pool stopped")
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     try:
@@ -42,19 +194,68 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
             expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         
         to_encode.update({"exp": expire})
+        # Unique token id, so a single token can be revoked (see app.core.revocation)
+        to_encode.setdefault("jti", uuid.uuid4().hex)
         logger.info(f"Creating access token with data: {to_encode}")
         
-        encoded_jwt = jwt.encode(
-            to_encode,
-            settings.SECRET_KEY,
-            algorithm=settings.ALGORITHM
-        )
+        key_ring = get_key_ring()
+        if key_ring is not None:
+            signing_key = key_ring.signing_key()
+            encoded_jwt = jwt.encode(
+                to_encode,
+                signing_key.private_key,
+                algorithm=signing_key.algorithm,
+                headers={"kid": signing_key.kid}
+            )
+        else:
+            encoded_jwt = jwt.encode(
+                to_encode,
+                settings.SECRET_KEY,
+                algorithm=settings.ALGORITHM
+            )
         logger.info("Access token created successfully")
         return encoded_jwt
     except Exception as e:
         logger.error(f"Error creating access token: {str(e)}", exc_info=True)
         raise
 
-def generate_verification_token() -> str:
-    """Generate a random verification token."""
-    return secrets.token_urlsafe(32) 
\ No newline at end of file
+# Claims of tokens whose signature and exp have already been checked, keyed by
+# the SHA-256 of the whole token (so a token with any other signature never
+# matches). Only the cryptographic check is cached: anything that can change
+# during a token's lifetime, such as revocation, must be checked by the caller
+# on every request, after decoding.
+token_claims_cache = TTLCache(
+    settings.JWT_CACHE_MAX_ENTRIES,
+    ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    max_weight=settings.JWT_CACHE_MAX_BYTES,
+)
+
+# Rough per-entry overhead of the digest key, OrderedDict slot and claims dict
+_CLAIMS_ENTRY_OVERHEAD = 400
+
+def decode_access_token(token: str) -> dict:
+    """
+    Verify an access token and return its claims.
+
+    Raises JWTError like jwt.decode. Repeat calls with the same token are
+    served from `token_claims_cache` until the token's exp.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    claims = token_claims_cache.get(key)
+    if claims is None:
+        key_ring = get_key_ring()
+        if key_ring is not None:
+            kid = jwt.get_unverified_header(token).get("kid")
+            verification_key = key_ring.verification_key(kid)
+        else:
+            verification_key = settings.SECRET_KEY
+        claims = jwt.decode(token, verification_key, algorithms=[settings.ALGORITHM])
+        exp = claims.get("exp")
+        if isinstance(exp, (int, float)):
+            token_claims_cache.set(
+                key,
+                claims,
+                ttl=exp - time.time(),
+                weight=_CLAIMS_ENTRY_OVERHEAD + 2 * len(token),
+            )
+    return dict(claims) 
\ No newline at end of file
@@ -0,0 +1,511 @@
+import asyncio
+import logging
+import smtplib
+import ssl
+import threading
+import time
+from collections import deque
+from email.message import Message
+from typing import Deque, List, Optional, Sequence, Union
+import aiosmtplib
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _Connection:
+    __slots__ = ('smtp', 'created', 'last_used', 'uses')
+
+    def __init__(self, smtp: Union[smtplib.SMTP, aiosmtplib.SMTP]):
+        self.smtp = smtp
+        self.created = self.last_used = time.monotonic()
+        self.uses = 0
+
+
+class _BasePool:
+    """Settings and counters shared by the blocking and the asyncio pool."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str = "",
+        password: str = "",
+        use_tls: bool = True,
+        size: int = 4,
+        max_age: float = 600,
+        keepalive_interval: float = 30,
+        idle_timeout: float = 240,
+        timeout: float = 30,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.size = size
+        self.max_age = max_age
+        self.keepalive_interval = keepalive_interval
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle: Deque[_Connection] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self.opened = 0
+        self.reused = 0
+        self.recycled = 0
+        self.dropped = 0
+        self.sent = 0
+        self.send_errors = 0
+
+    def stats(self) -> dict:
+        return {
+            "transport": self.transport,
+            "size": self.size,
+            "idle": len(self._idle),
+            "opened": self.opened,
+            "reused": self.reused,
+            "recycled": self.recycled,
+            "dropped": self.dropped,
+            "sent": self.sent,
+            "send_errors": self.send_errors,
+        }
+
+
+class SMTPConnectionPool(_BasePool):
+    """
+    A pool of connected, authenticated SMTP sessions shared by all senders.
+
+    Sending runs in executor threads, so the pool is thread-safe and
+    blocking. At most `size` sessions exist at once; a sender waits for a
+    free one. A session idle longer than `keepalive_interval` is checked with
+    NOOP before reuse, sessions older than `max_age` are replaced, and any
+    session that fails mid-conversation is dropped. `keepalive` (run
+    periodically by `start`) NOOPs idle sessions so the server doesn't time
+    them out, and closes those idle longer than `idle_timeout`.
+    """
+
+    transport = "thread"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+
+    def _open(self) -> _Connection:
+        logger.info(f"Opening SMTP connection to {self.host}:{self.port}")
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            # Set ESMTP features for MailMug
+            smtp.esmtp_features["auth"] = "LOGIN DIGEST-MD5 PLAIN"
+            if self.use_tls:
+                try:
+                    smtp.starttls(context=ssl.create_default_context())
+                except smtplib.SMTPNotSupportedError:
+                    logger.warning("STARTTLS not supported by server, continuing without encryption")
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            self._close(smtp)
+            raise
+        self.opened += 1
+        return _Connection(smtp)
+
+    @staticmethod
+    def _close(smtp: smtplib.SMTP) -> None:
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+    @staticmethod
+    def _alive(conn: _Connection) -> bool:
+        try:
+            return conn.smtp.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self) -> _Connection:
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("Timed out waiting for a free SMTP connection")
+        try:
+            while True:
+                with self._lock:
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    return self._open()
+                now = time.monotonic()
+                if now - conn.created > self.max_age:
+                    self.recycled += 1
+                    self._close(conn.smtp)
+                elif now - conn.last_used > self.keepalive_interval and not self._alive(conn):
+                    self.dropped += 1
+                    conn.smtp.close()
+                else:
+                    self.reused += 1
+                    return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn: _Connection) -> None:
+        conn.last_used = time.monotonic()
+        conn.uses += 1
+        with self._lock:
+            # A sender may have opened an extra session while keepalive held the idle ones
+            surplus = len(self._idle) >= self.size
+            if not surplus:
+                self._idle.append(conn)
+        if surplus:
+            self.recycled += 1
+            self._close(conn.smtp)
+        self._slots.release()
+
+    def _discard(self, conn: _Connection) -> None:
+        self.dropped += 1
+        conn.smtp.close()
+        self._slots.release()
+
+    def send_message(self, msg: Message) -> None:
+        """Send one message over a pooled session; see `send_many`."""
+        error = self.send_many([msg])[0]
+        if error is not None:
+            raise error
+
+    def send_many(self, messages: Sequence[Message]) -> List[Optional[Exception]]:
+        """
+        Send messages back to back over one pooled session (one
+        MAIL/RCPT/DATA cycle each) and return the error for each message, or
+        None if it was sent.
+
+        A rejected message doesn't affect the others. If the session breaks,
+        the failed message is reported and the rest continue on a new one;
+        only when a reused session turns out to have been closed by the
+        server before anything was sent is the message retried.
+        """
+        results: List[Optional[Exception]] = [None] * len(messages)
+        index = 0
+        retried = False
+        while index < len(messages):
+            try:
+                conn = self._checkout()
+            except Exception as e:
+                self.send_errors += len(messages) - index
+                results[index:] = [e] * (len(messages) - index)
+                break
+            first = True
+            try:
+                while index < len(messages):
+                    try:
+                        conn.smtp.send_message(messages[index])
+                        self.sent += 1
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as e:
+                        # The server rejected this message; unless it is
+                        # closing the session (421) the session itself is fine
+                        if getattr(e, 'smtp_code', None) == 421:
+                            raise
+                        self.send_errors += 1
+                        results[index] = e
+                    index += 1
+                    first = False
+            except Exception as e:
+                self._discard(conn)
+                if isinstance(e, smtplib.SMTPServerDisconnected) and first and conn.uses and not retried:
+                    retried = True
+                    continue
+                self.send_errors += 1
+                results[index] = e
+                index += 1
+                continue
+            self._checkin(conn)
+        return results
+
+    def keepalive(self) -> None:
+        """NOOP idle sessions that are due, closing expired or broken ones."""
+        now = time.monotonic()
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        keep = []
+        for conn in idle:
+            if now - conn.created > self.max_age or now - conn.last_used > self.idle_timeout:
+                self.recycled += 1
+                self._close(conn.smtp)
+            elif now - conn.last_used >= self.keepalive_interval and not self._alive(conn):
+                self.dropped += 1
+                conn.smtp.close()
+            else:
+                keep.append(conn)
+        with self._lock:
+            # Sessions checked in meanwhile are the most recently used; keep them on top
+            self._idle.extendleft(reversed(keep))
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for conn in idle:
+            self._close(conn.smtp)
+
+    async def _keepalive_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            try:
+                await loop.run_in_executor(None, self.keepalive)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in SMTP keepalive: {str(e)}")
+
+    def start(self) -> None:
+        """Keep idle sessions alive in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._keepalive_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+class AsyncSMTPConnectionPool(_BasePool):
+    """
+    The same pool on aiosmtplib: sessions are driven from the event loop,
+    so sending mail uses no executor threads.
+
+    An asyncio semaphore caps the number of sessions, and so the number of
+    concurrent sends, at `size`. Checkout, keepalive and recycling work as in
+    `SMTPConnectionPool`. Each message must be sent within `send_timeout`
+    seconds; a session that times out mid-message is dropped, since its
+    state is unknown.
+    """
+
+    transport = "asyncio"
+
+    def __init__(self, *args, send_timeout: float = 60, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.send_timeout = send_timeout
+        self._slots = asyncio.Semaphore(self.size)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _bind_loop(self) -> None:
+        # Sessions belong to the event loop that opened them; start afresh
+        # if the pool is used from a new one (another asyncio.run)
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._loop is not None:
+            for conn in self._idle:
+                try:
+                    conn.smtp.close()
+                except RuntimeError:
+                    pass
+            self._idle.clear()
+            self._slots = asyncio.Semaphore(self.size)
+        self._loop = loop
+
+    async def _open(self) -> _Connection:
+        logger.info(f"Opening SMTP connection to {self.host}:{self.port}")
+        smtp = aiosmtplib.SMTP(hostname=self.host, port=self.port, timeout=self.timeout, start_tls=False)
+        await smtp.connect()
+        try:
+            await smtp.ehlo()
+            if self.use_tls:
+                if smtp.supports_extension("starttls"):
+                    await smtp.starttls(tls_context=ssl.create_default_context())
+                else:
+                    logger.warning("STARTTLS not supported by server, continuing without encryption")
+            if self.username:
+                if not smtp.supports_extension("auth"):
+                    # Set ESMTP features for MailMug, which doesn't advertise AUTH
+                    smtp.esmtp_extensions["auth"] = "LOGIN PLAIN"
+                    smtp.server_auth_methods = ["login", "plain"]
+                await smtp.login(self.username, self.password)
+        except Exception:
+            await self._close(smtp)
+            raise
+        self.opened += 1
+        return _Connection(smtp)
+
+    @staticmethod
+    async def _close(smtp: aiosmtplib.SMTP) -> None:
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    @staticmethod
+    async def _alive(conn: _Connection) -> bool:
+        try:
+            return (await conn.smtp.noop()).code == 250
+        except Exception:
+            return False
+
+    async def _checkout(self) -> _Connection:
+        self._bind_loop()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("Timed out waiting for a free SMTP connection") from None
+        try:
+            while self._idle:
+                conn = self._idle.pop()
+                now = time.monotonic()
+                if now - conn.created > self.max_age:
+                    self.recycled += 1
+                    await self._close(conn.smtp)
+                elif now - conn.last_used > self.keepalive_interval and not await self._alive(conn):
+                    self.dropped += 1
+                    conn.smtp.close()
+                else:
+                    self.reused += 1
+                    return conn
+            return await self._open()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def _checkin(self, conn: _Connection) -> None:
+        conn.last_used = time.monotonic()
+        conn.uses += 1
+        # A sender may have opened an extra session while keepalive held the idle ones
+        surplus = len(self._idle) >= self.size
+        if not surplus:
+            self._idle.append(conn)
+        self._slots.release()
+        if surplus:
+            self.recycled += 1
+            await self._close(conn.smtp)
+
+    def _discard(self, conn: _Connection) -> None:
+        self.dropped += 1
+        conn.smtp.close()
+        self._slots.release()
+
+    async def send_message(self, msg: Message) -> None:
+        """Send one message over a pooled session; see `send_many`."""
+        error = (await self.send_many([msg]))[0]
+        if error is not None:
+            raise error
+
+    async def send_many(self, messages: Sequence[Message]) -> List[Optional[Exception]]:
+        """Send messages back to back over one pooled session, as `SMTPConnectionPool.send_many`."""
+        results: List[Optional[Exception]] = [None] * len(messages)
+        index = 0
+        retried = False
+        while index < len(messages):
+            try:
+                conn = await self._checkout()
+            except Exception as e:
+                self.send_errors += len(messages) - index
+                results[index:] = [e] * (len(messages) - index)
+                break
+            first = True
+            try:
+                while index < len(messages):
+                    try:
+                        await asyncio.wait_for(conn.smtp.send_message(messages[index]), self.send_timeout)
+                        self.sent += 1
+                    except (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPResponseException) as e:
+                        # The server rejected this message; aiosmtplib closes
+                        # the session itself when the server is going away (421)
+                        if not conn.smtp.is_connected:
+                            raise
+                        self.send_errors += 1
+                        results[index] = e
+                    index += 1
+                    first = False
+            except Exception as e:
+                self._discard(conn)
+                if isinstance(e, aiosmtplib.SMTPServerDisconnected) and first and conn.uses and not retried:
+                    retried = True
+                    continue
+                self.send_errors += 1
+                results[index] = e
+                index += 1
+                continue
+            except BaseException:
+                self._discard(conn)
+                raise
+            await self._checkin(conn)
+        return results
+
+    async def keepalive(self) -> None:
+        """NOOP idle sessions that are due, closing expired or broken ones."""
+        now = time.monotonic()
+        idle, self._idle = self._idle, deque()
+        keep = []
+        for conn in idle:
+            if now - conn.created > self.max_age or now - conn.last_used > self.idle_timeout:
+                self.recycled += 1
+                await self._close(conn.smtp)
+            elif now - conn.last_used >= self.keepalive_interval and not await self._alive(conn):
+                self.dropped += 1
+                conn.smtp.close()
+            else:
+                keep.append(conn)
+        # Sessions checked in meanwhile are the most recently used; keep them on top
+        self._idle.extendleft(reversed(keep))
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, deque()
+        for conn in idle:
+            await self._close(conn.smtp)
+
+    async def _keepalive_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            try:
+                await self.keepalive()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in SMTP keepalive: {str(e)}")
+
+    def start(self) -> None:
+        """Keep idle sessions alive in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._keepalive_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.close()
+
+
+SMTP_TRANSPORTS = {
+    SMTPConnectionPool.transport: SMTPConnectionPool,
+    AsyncSMTPConnectionPool.transport: AsyncSMTPConnectionPool,
+}
+
+
+def create_smtp_pool() -> Union[SMTPConnectionPool, AsyncSMTPConnectionPool]:
+    """Build the pool for the configured SMTP_TRANSPORT."""
+    if settings.SMTP_TRANSPORT not in SMTP_TRANSPORTS:
+        raise ValueError(
+            f"Unknown SMTP_TRANSPORT {settings.SMTP_TRANSPORT!r}; expected one of {', '.join(SMTP_TRANSPORTS)}"
+        )
+    options = dict(
+        use_tls=settings.SMTP_TLS,
+        size=settings.SMTP_POOL_SIZE,
+        max_age=settings.SMTP_POOL_MAX_AGE_SECONDS,
+        keepalive_interval=settings.SMTP_POOL_KEEPALIVE_SECONDS,
+        idle_timeout=settings.SMTP_POOL_IDLE_TIMEOUT_SECONDS,
+        timeout=settings.SMTP_TIMEOUT,
+    )
+    if settings.SMTP_TRANSPORT == AsyncSMTPConnectionPool.transport:
+        options["send_timeout"] = settings.SMTP_SEND_TIMEOUT
+    return SMTP_TRANSPORTS[settings.SMTP_TRANSPORT](
+        settings.SMTP_HOST, settings.SMTP_PORT, settings.SMTP_USER, settings.SMTP_PASSWORD, **options
+    )
+
+
+smtp_pool = create_smtp_pool()
@@ -0,0 +1,92 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import struct
+import time
+import uuid
+from functools import lru_cache
+from typing import NamedTuple, Optional
+from app.core.config import settings
+
+VERIFY_EMAIL = "verify_email"
+RESET_PASSWORD = "reset_password"
+
+# user id (16 bytes), expiry (epoch seconds) and an 8-byte version fingerprint
+_PAYLOAD = struct.Struct(">16sQ8s")
+_SIGNATURE_SIZE = 32
+
+
+class InvalidUserToken(ValueError):
+    """The token is malformed, forged, for another purpose or expired."""
+
+
+@lru_cache(maxsize=None)
+def _purpose_key(secret: str, purpose: str) -> bytes:
+    # A key per purpose, so a verification token can never pass as a reset token
+    return hmac.new(secret.encode(), f"user-token:{purpose}".encode(), hashlib.sha256).digest()
+
+
+def _fingerprint(key: bytes, value: str) -> bytes:
+    return hmac.new(key, b"version:" + value.encode(), hashlib.sha256).digest()[:8]
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+class UserToken(NamedTuple):
+    user_id: str
+    purpose: str
+    version: bytes
+    expires_at: int
+
+    def matches(self, value: str) -> bool:
+        """Whether the token was issued for this version value (e.g. the current password hash)."""
+        key = _purpose_key(settings.SECRET_KEY, self.purpose)
+        return hmac.compare_digest(self.version, _fingerprint(key, value))
+
+
+def create_user_token(user_id, purpose: str, version: str, expires_in: float) -> str:
+    """
+    Sign a token for `purpose` that names the user and expires in
+    `expires_in` seconds. `version` is a value that changes once the token
+    has been used (the password hash for resets, the email for
+    verification); only a fingerprint of it is embedded.
+    """
+    key = _purpose_key(settings.SECRET_KEY, purpose)
+    payload = _PAYLOAD.pack(
+        uuid.UUID(str(user_id)).bytes, int(time.time() + expires_in), _fingerprint(key, version)
+    )
+    signature = hmac.new(key, payload, hashlib.sha256).digest()
+    return _b64encode(payload + signature)
+
+
+def verify_user_token(token: str, purpose: str, now: Optional[float] = None) -> UserToken:
+    """Check the signature and expiry of a token without touching the database."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (binascii.Error, ValueError):
+        raise InvalidUserToken("Malformed token")
+    if len(raw) != _PAYLOAD.size + _SIGNATURE_SIZE:
+        raise InvalidUserToken("Malformed token")
+    payload, signature = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+    key = _purpose_key(settings.SECRET_KEY, purpose)
+    if not hmac.compare_digest(signature, hmac.new(key, payload, hashlib.sha256).digest()):
+        raise InvalidUserToken("Invalid token signature")
+    user_id, expires_at, version = _PAYLOAD.unpack(payload)
+    if expires_at <= (time.time() if now is None else now):
+        raise InvalidUserToken("Token has expired")
+    return UserToken(str(uuid.UUID(bytes=user_id)), purpose, version, expires_at)
+
+
+def create_verification_token(user_id, email: str) -> str:
+    return create_user_token(
+        user_id, VERIFY_EMAIL, email.lower(), settings.EMAIL_VERIFICATION_TOKEN_EXPIRE_HOURS * 3600
+    )
+
+
+def create_password_reset_token(user_id, hashed_password: str) -> str:
+    return create_user_token(
+        user_id, RESET_PASSWORD, hashed_password, settings.PASSWORD_RESET_TOKEN_EXPIRE_MINUTES * 60
+    )
@@ -1,14 +1,36 @@
 import asyncio
 import logging
-from app.db.migrations import run_migrations
+from app.db.migrations import run_migrations, get_schema_version, LATEST_VERSION
+from app.db.pool import get_pool
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
 async def init_db():
-    """Initialize the database with all migrations."""
+    """
+    Make sure the database schema is current on startup.
+
+    Costs a single version query on a pooled connection when nothing is
+    pending. What happens otherwise depends on MIGRATIONS_ON_STARTUP:
+    "apply" runs the pending migrations, "check" refuses to start, and
+    "skip" does not look at the schema at all.
+    """
+    mode = settings.MIGRATIONS_ON_STARTUP
+    if mode == "skip":
+        logger.info("Skipping database schema check (MIGRATIONS_ON_STARTUP=skip)")
+        return
     try:
-        logger.info("Starting database initialization...")
+        async with get_pool().acquire() as conn:
+            version = await get_schema_version(conn)
+        if version >= LATEST_VERSION:
+            logger.info(f"Database schema is up to date (version {version})")
+            return
+        if mode == "check":
+            raise RuntimeError(
+                f"Database schema is at version {version}, expected {LATEST_VERSION}. "
+                "Run `python -m app.db.migrations` to apply pending migrations."
+            )
+        logger.info(f"Database schema is at version {version}, applying migrations up to {LATEST_VERSION}")
         await run_migrations()
         logger.info("Database initialization completed successfully")
     except Exception as e:
@@ -16,4 +38,4 @@ async def init_db():
         raise
 
 if __name__ == "__main__":
-    asyncio.run(init_db()) 
\ No newline at end of file
+    asyncio.run(run_migrations())
@@ -1,59 +1,222 @@
+import asyncio
 import asyncpg
 import logging
+from typing import Awaitable, Callable, List, NamedTuple
 from app.core.config import settings
-from sqlalchemy import create_engine, text
 
 logger = logging.getLogger(__name__)
 
-async def run_migrations():
-    """Run all migrations for the users table."""
+# Token lookup indexes that older schemas may have, full-table (from
+# app/db/migrations/add_reset_token.sql) or partial. Verification and reset
+# links are signed tokens (app.core.tokens) and are never looked up, so the
+# indexes only slow down writes to users.
+TOKEN_INDEXES = (
+    'idx_users_reset_token', 'idx_users_verification_token',
+    'idx_users_pending_reset_token', 'idx_users_pending_verification_token',
+)
+
+async def create_index_concurrently(conn: asyncpg.Connection, name: str, definition: str) -> None:
+    """
+    Build an index with CREATE INDEX CONCURRENTLY.
+
+    A failed concurrent build leaves an INVALID index behind, so an existing
+    invalid index is dropped and rebuilt. Must run outside a transaction.
+    """
+    is_valid = await conn.fetchval('''
+        SELECT i.indisvalid
+        FROM pg_class c
+        JOIN pg_index i ON i.indexrelid = c.oid
+        WHERE c.relname = $1
+    ''', name)
+    if is_valid:
+        return
+    if is_valid is not None:
+        logger.warning(f"Index {name} is invalid, rebuilding it")
+        await conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+    logger.info(f"Creating index {name}")
+    await conn.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}')
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[[asyncpg.Connection], Awaitable[None]]
+    # CREATE INDEX CONCURRENTLY and friends cannot run inside a transaction
+    transactional: bool = True
+
+MIGRATIONS: List[Migration] = []
+
+def migration(version: int, description: str, transactional: bool = True):
+    """Register a schema migration. Versions must be added in increasing order."""
+    def register(func: Callable[[asyncpg.Connection], Awaitable[None]]):
+        if MIGRATIONS and version <= MIGRATIONS[-1].version:
+            raise ValueError(f"Migration {version} is out of order")
+        MIGRATIONS.append(Migration(version, description, func, transactional))
+        return func
+    return register
+
+# Arbitrary application-wide key for pg_advisory_lock; serializes migration runs
+# across every process that shares the database.
+MIGRATION_LOCK_ID = 724_311_902
+
+# The first migrations are written idempotently so databases created before
+# schema_version existed are brought up to date without errors.
+
+@migration(1, "create users table")
+async def create_users_table(conn: asyncpg.Connection) -> None:
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id UUID PRIMARY KEY,
+            first_name VARCHAR(255) NOT NULL,
+            last_name VARCHAR(255) NOT NULL,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            hashed_password VARCHAR(255) NOT NULL,
+            role VARCHAR(50) NULL,
+            is_active BOOLEAN DEFAULT FALSE,
+            is_verified BOOLEAN DEFAULT FALSE,
+            verification_token VARCHAR(255),
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+@migration(2, "add role column")
+async def add_role_column(conn: asyncpg.Connection) -> None:
+    await conn.execute('''
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'users' AND column_name = 'role') THEN
+                ALTER TABLE users ADD COLUMN role VARCHAR(50) NOT NULL DEFAULT 'user';
+            END IF;
+        END $$;
+    ''')
+
+@migration(3, "add reset_token, last_login, last_logout and provider columns")
+async def add_user_model_columns(conn: asyncpg.Connection) -> None:
+    await conn.execute('''
+        ALTER TABLE users
+            ADD COLUMN IF NOT EXISTS reset_token VARCHAR(255),
+            ADD COLUMN IF NOT EXISTS last_login TIMESTAMP WITH TIME ZONE,
+            ADD COLUMN IF NOT EXISTS last_logout TIMESTAMP WITH TIME ZONE,
+            ADD COLUMN IF NOT EXISTS provider VARCHAR(50) NOT NULL DEFAULT 'email'
+    ''')
+
+@migration(4, "drop unused token lookup indexes", transactional=False)
+async def drop_token_indexes(conn: asyncpg.Connection) -> None:
+    # The verification_token and reset_token columns are kept, unused, so
+    # older application versions can still run against this schema
+    for name in TOKEN_INDEXES:
+        await conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+@migration(5, "keyset pagination index on users (created_at, id)", transactional=False)
+async def add_user_listing_index(conn: asyncpg.Connection) -> None:
+    await create_index_concurrently(conn, 'idx_users_created_at_id', 'ON users (created_at, id)')
+
+@migration(6, "create revoked_tokens table")
+async def create_revoked_tokens_table(conn: asyncpg.Connection) -> None:
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS revoked_tokens (
+            jti VARCHAR(64) PRIMARY KEY,
+            user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+            expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            revoked_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    await conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_revoked_tokens_revoked_at ON revoked_tokens (revoked_at)
+    ''')
+
+@migration(7, "create email_outbox table")
+async def create_email_outbox_table(conn: asyncpg.Connection) -> None:
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id BIGSERIAL PRIMARY KEY,
+            kind VARCHAR(50) NOT NULL,
+            recipient VARCHAR(255) NOT NULL,
+            payload JSONB NOT NULL DEFAULT '{}',
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            last_error TEXT,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP WITH TIME ZONE
+        )
+    ''')
+    # Only pending rows are indexed; sent ones never need to be found again
+    await conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_email_outbox_pending
+        ON email_outbox (available_at, id) WHERE status = 'pending'
+    ''')
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+async def get_schema_version(conn: asyncpg.Connection) -> int:
+    """Return the highest applied migration version, 0 for an unversioned database."""
+    try:
+        return await conn.fetchval('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+    except asyncpg.UndefinedTableError:
+        return 0
+
+async def _acquire_migration_lock(conn: asyncpg.Connection) -> None:
+    # Poll with pg_try_advisory_lock instead of blocking in pg_advisory_lock:
+    # a blocked statement keeps a snapshot open, which a CREATE INDEX
+    # CONCURRENTLY running in the lock holder would wait on forever.
+    waiting = False
+    while not await conn.fetchval('SELECT pg_try_advisory_lock($1)', MIGRATION_LOCK_ID):
+        if not waiting:
+            logger.info("Another process is applying migrations, waiting...")
+            waiting = True
+        await asyncio.sleep(settings.MIGRATION_LOCK_POLL_INTERVAL)
+
+async def run_migrations() -> int:
+    """
+    Apply pending migrations and return the resulting schema version.
+
+    Exactly one process applies migrations at a time (advisory lock); the
+    others wait for it and then find nothing left to do.
+    """
     logger.info("Starting migrations...")
-    logger.info(f"Database URL: {settings.DATABASE_URL}")
     
     try:
         conn = await asyncpg.connect(settings.DATABASE_URL)
         logger.info("Connected to database successfully")
-        
-        # Create users table
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id UUID PRIMARY KEY,
-                first_name VARCHAR(255) NOT NULL,
-                last_name VARCHAR(255) NOT NULL,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                hashed_password VARCHAR(255) NOT NULL,
-                role VARCHAR(50) NULL,
-                is_active BOOLEAN DEFAULT FALSE,
-                is_verified BOOLEAN DEFAULT FALSE,
-                verification_token VARCHAR(255),
-                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        logger.info("Users table created successfully")
-        
-        # Migration: Add role column if it doesn't exist
-        await conn.execute('''
-            DO $$
-            BEGIN
-                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'users' AND column_name = 'role') THEN
-                    ALTER TABLE users ADD COLUMN role VARCHAR(50) NOT NULL DEFAULT 'user';
-                END IF;
-            END $$;
-        ''')
-        logger.info("Migration completed: role column added if not present")
-        
-        await conn.close()
-        logger.info("Migrations completed successfully")
+        try:
+            await _acquire_migration_lock(conn)
+            try:
+                await conn.execute('''
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        description TEXT NOT NULL,
+                        applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                current = await get_schema_version(conn)
+                for pending in MIGRATIONS:
+                    if pending.version <= current:
+                        continue
+                    logger.info(f"Applying migration {pending.version}: {pending.description}")
+                    if pending.transactional:
+                        async with conn.transaction():
+                            await pending.apply(conn)
+                            await _record_version(conn, pending)
+                    else:
+                        await pending.apply(conn)
+                        await _record_version(conn, pending)
+                    current = pending.version
+            finally:
+                await conn.execute('SELECT pg_advisory_unlock($1)', MIGRATION_LOCK_ID)
+        finally:
+            await conn.close()
+        logger.info(f"Migrations completed successfully, schema version is {current}")
+        return current
     except Exception as e:
         logger.error(f"Migration error: {str(e)}")
         raise
 
+async def _record_version(conn: asyncpg.Connection, applied: Migration) -> None:
+    await conn.execute(
+        'INSERT INTO schema_version (version, description) VALUES ($1, $2)',
+        applied.version, applied.description
+    )
+
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(run_migrations())
-
-engine = create_engine(settings.DATABASE_URL)
-with engine.connect() as conn:
-    conn.execute(text("DROP SCHEMA public CASCADE; CREATE SCHEMA public;"))
-    conn.commit()
\ No newline at end of file
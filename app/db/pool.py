@@ -0,0 +1,246 @@
+import asyncio
+import asyncpg
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+from app.core.config import settings
+from app.db.statements import statements
+
+logger = logging.getLogger(__name__)
+
+# A pool that fails to open is retried after 1s, 2s, 4s, ... up to this many seconds
+REOPEN_MAX_DELAY = 60
+
+
+class PooledConnection(asyncpg.Connection):
+    """asyncpg connection that keeps per-connection bookkeeping for the pool."""
+
+    __slots__ = ('_last_released',)
+
+    def mark_released(self) -> None:
+        self._last_released = time.monotonic()
+
+    def idle_seconds(self) -> float:
+        try:
+            return time.monotonic() - self._last_released
+        except AttributeError:
+            return 0.0
+
+
+class DatabasePool:
+    """
+    Process-wide asyncpg connection pool.
+
+    Connections are leased with `acquire()`; a connection that has been idle
+    for longer than DB_POOL_HEALTH_CHECK_INTERVAL is pinged before it is
+    handed out, and replaced if the ping fails. If opening the pool fails,
+    `lease` tries again once the backoff delay has passed.
+    """
+
+    def __init__(self, dsn: str, name: str = "primary"):
+        self.dsn = dsn
+        self.name = name
+        self._pool: Optional[asyncpg.Pool] = None
+        self._waiters = 0
+        self._acquired = 0
+        self._timeouts = 0
+        self._health_check_failures = 0
+        self._open_failures = 0
+        self._reopen_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._pool is not None
+
+    @property
+    def is_available(self) -> bool:
+        """Open, or closed by a failure and due for another attempt."""
+        return self._pool is not None or (
+            self._reopen_at is not None and time.monotonic() >= self._reopen_at
+        )
+
+    async def open(self) -> None:
+        """Create the underlying asyncpg pool."""
+        if self._pool is not None:
+            return
+        logger.info(
+            f"Opening database pool '{self.name}' "
+            f"(min_size={settings.DB_POOL_MIN_SIZE}, max_size={settings.DB_POOL_MAX_SIZE})"
+        )
+        try:
+            self._pool = await self._create_pool()
+        except Exception:
+            self._open_failures += 1
+            self._reopen_at = time.monotonic() + min(2 ** (self._open_failures - 1), REOPEN_MAX_DELAY)
+            raise
+        self._open_failures = 0
+        self._reopen_at = None
+        logger.info(f"Database pool '{self.name}' opened")
+
+    async def _create_pool(self) -> asyncpg.Pool:
+        return await asyncpg.create_pool(
+            self.dsn,
+            min_size=settings.DB_POOL_MIN_SIZE,
+            max_size=settings.DB_POOL_MAX_SIZE,
+            max_queries=settings.DB_POOL_MAX_QUERIES,
+            max_inactive_connection_lifetime=settings.DB_POOL_MAX_IDLE_SECONDS,
+            command_timeout=settings.DB_COMMAND_TIMEOUT,
+            connection_class=PooledConnection,
+            # Large enough to keep every registered statement prepared on
+            # each connection (see app.db.statements)
+            statement_cache_size=max(settings.DB_STATEMENT_CACHE_SIZE, 2 * len(statements)),
+            init=self._init_connection,
+        )
+
+    async def close(self) -> None:
+        """Close the pool, waiting for leased connections to be released."""
+        self._reopen_at = None
+        if self._pool is None:
+            return
+        pool, self._pool = self._pool, None
+        logger.info(f"Closing database pool '{self.name}'")
+        try:
+            await asyncio.wait_for(pool.close(), timeout=settings.DB_POOL_ACQUIRE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Timed out closing database pool '{self.name}', terminating connections")
+            pool.terminate()
+
+    async def _init_connection(self, conn: PooledConnection) -> None:
+        """Run once for every new physical connection."""
+        conn.mark_released()
+
+    @asynccontextmanager
+    async def acquire(self, timeout: Optional[float] = None) -> AsyncIterator[asyncpg.Connection]:
+        """Lease a healthy connection from the pool for the duration of the block."""
+        conn = await self.lease(timeout)
+        try:
+            yield conn
+        finally:
+            await self.release(conn)
+
+    async def lease(self, timeout: Optional[float] = None) -> asyncpg.Connection:
+        """
+        Take a healthy connection out of the pool.
+
+        Raises asyncio.TimeoutError if none becomes available within `timeout`
+        (defaults to DB_POOL_ACQUIRE_TIMEOUT). The caller must hand the
+        connection back with `release()`.
+        """
+        if self._pool is None:
+            if not self.is_available:
+                raise RuntimeError(f"Database pool '{self.name}' is not open")
+            # Push the next attempt back first so concurrent callers don't all retry
+            self._reopen_at = time.monotonic() + REOPEN_MAX_DELAY
+            await self.open()
+        timeout = settings.DB_POOL_ACQUIRE_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        self._waiters += 1
+        try:
+            while True:
+                try:
+                    conn = await self._pool.acquire(timeout=max(deadline - time.monotonic(), 0.001))
+                except asyncio.TimeoutError:
+                    self._timeouts += 1
+                    logger.error(f"Timed out after {timeout}s waiting for a connection from pool '{self.name}'")
+                    raise
+                if await self._is_healthy(conn):
+                    self._acquired += 1
+                    return conn
+                self._health_check_failures += 1
+                logger.warning(f"Discarding unhealthy connection from pool '{self.name}'")
+                conn.terminate()
+                await self._pool.release(conn)
+        finally:
+            self._waiters -= 1
+
+    async def release(self, conn: asyncpg.Connection) -> None:
+        """Return a leased connection to the pool."""
+        try:
+            conn.mark_released()
+        except AttributeError:
+            # The connection was closed while leased and is already detached
+            pass
+        if self._pool is not None:
+            await self._pool.release(conn)
+        else:
+            conn.terminate()
+
+    async def _is_healthy(self, conn: asyncpg.Connection) -> bool:
+        if conn.is_closed():
+            return False
+        if conn.idle_seconds() < settings.DB_POOL_HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            await conn.fetchval("SELECT 1", timeout=settings.DB_POOL_ACQUIRE_TIMEOUT)
+            return True
+        except Exception as e:
+            logger.warning(f"Health check failed on pool '{self.name}': {str(e)}")
+            return False
+
+    def stats(self) -> dict:
+        """Return current pool usage counters."""
+        if self._pool is None:
+            return {"open": False, "waiters": self._waiters, "open_failures": self._open_failures}
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        return {
+            "open": True,
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+            "size": size,
+            "in_use": size - idle,
+            "idle": idle,
+            "waiters": self._waiters,
+            "acquired_total": self._acquired,
+            "acquire_timeouts": self._timeouts,
+            "health_check_failures": self._health_check_failures,
+        }
+
+
+_pools: Dict[str, DatabasePool] = {}
+_replicas: List[DatabasePool] = []
+
+
+def get_pool(name: str = "primary") -> DatabasePool:
+    """Return a configured pool by name."""
+    try:
+        return _pools[name]
+    except KeyError:
+        raise RuntimeError(f"Database pool '{name}' has not been initialized")
+
+
+def get_replica_pools() -> List[DatabasePool]:
+    """Return the read replica pools, empty when no replicas are configured."""
+    return _replicas
+
+
+async def init_pools() -> None:
+    """Open the process-wide pools. Called from the application startup hook."""
+    if "primary" not in _pools:
+        _pools["primary"] = DatabasePool(settings.DATABASE_URL, name="primary")
+        replica_urls = [url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+        for index, url in enumerate(replica_urls):
+            replica = _pools[f"replica-{index}"] = DatabasePool(url, name=f"replica-{index}")
+            _replicas.append(replica)
+    for pool in _pools.values():
+        try:
+            await pool.open()
+        except Exception as e:
+            if pool not in _replicas:
+                raise
+            # Reads go to the primary until a retry in `lease` reaches the replica
+            logger.error(f"Could not open replica pool '{pool.name}': {str(e)}")
+
+
+async def close_pools() -> None:
+    """Close every open pool. Called from the application shutdown hook."""
+    for pool in list(_pools.values()):
+        await pool.close()
+    _pools.clear()
+    _replicas.clear()
+
+
+def get_pool_stats() -> Dict[str, dict]:
+    """Return stats for every configured pool, keyed by pool name."""
+    return {name: pool.stats() for name, pool in _pools.items()}
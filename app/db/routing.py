@@ -0,0 +1,104 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional, Tuple
+import asyncpg
+from app.core.config import settings
+from app.db.pool import DatabasePool, get_pool, get_replica_pools
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseRouter:
+    """
+    Routes reads to replica pools and writes to the primary.
+
+    Read-your-writes: after a write for a key (a user id), reads for that key
+    go to the primary for READ_YOUR_WRITES_SECONDS so a lagging replica never
+    serves data older than the caller's own write. Pins are per process, so
+    the window should comfortably exceed normal replication lag.
+    """
+
+    # Upper bound on remembered pins; the oldest are dropped first
+    MAX_PINS = 100_000
+
+    def __init__(self):
+        self._pinned: "OrderedDict[str, float]" = OrderedDict()
+        self._round_robin = itertools.count()
+        self._primary_reads = 0
+        self._replica_reads = 0
+        self._pinned_reads = 0
+        self._replica_fallbacks = 0
+
+    def record_write(self, key) -> None:
+        """Pin reads for `key` to the primary for the read-your-writes window."""
+        if settings.READ_YOUR_WRITES_SECONDS <= 0:
+            return
+        key = str(key)
+        self._pinned.pop(key, None)
+        self._pinned[key] = time.monotonic() + settings.READ_YOUR_WRITES_SECONDS
+        self._expire_pins()
+
+    def is_pinned(self, key) -> bool:
+        if key is None:
+            return False
+        expires = self._pinned.get(str(key))
+        return expires is not None and expires > time.monotonic()
+
+    def _expire_pins(self) -> None:
+        # Pins share one window length, so insertion order is expiry order
+        now = time.monotonic()
+        while self._pinned:
+            key, expires = next(iter(self._pinned.items()))
+            if expires > now and len(self._pinned) <= self.MAX_PINS:
+                break
+            del self._pinned[key]
+
+    def _read_pool(self, key=None) -> Optional[DatabasePool]:
+        # Replicas that failed to open stay out of rotation until a retry is due
+        replicas = [replica for replica in get_replica_pools() if replica.is_available]
+        if not replicas:
+            self._primary_reads += 1
+            return None
+        if self.is_pinned(key):
+            self._pinned_reads += 1
+            return None
+        self._replica_reads += 1
+        return replicas[next(self._round_robin) % len(replicas)]
+
+    async def lease_read(self, key=None) -> Tuple[asyncpg.Connection, DatabasePool]:
+        """Lease a connection for reads about `key`, falling back to the primary."""
+        replica = self._read_pool(key)
+        if replica is not None:
+            try:
+                return await replica.lease(), replica
+            except (asyncio.TimeoutError, OSError, RuntimeError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                self._replica_fallbacks += 1
+                logger.warning(f"Replica pool '{replica.name}' unavailable, reading from primary: {str(e)}")
+        primary = get_pool()
+        return await primary.lease(), primary
+
+    @asynccontextmanager
+    async def read(self, key=None) -> AsyncIterator[asyncpg.Connection]:
+        """Lease a read connection for the duration of the block."""
+        conn, pool = await self.lease_read(key)
+        try:
+            yield conn
+        finally:
+            await pool.release(conn)
+
+    def stats(self) -> dict:
+        return {
+            "replicas": len(get_replica_pools()),
+            "primary_reads": self._primary_reads,
+            "replica_reads": self._replica_reads,
+            "pinned_reads": self._pinned_reads,
+            "replica_fallbacks": self._replica_fallbacks,
+            "active_pins": len(self._pinned),
+        }
+
+
+db_router = DatabaseRouter()
@@ -1,24 +1,42 @@
+import asyncio
 import asyncpg
 import logging
 from typing import AsyncGenerator
+from fastapi import HTTPException, status
 from app.core.config import settings
+from app.db.pool import get_pool
+from app.db.routing import db_router
 
 logger = logging.getLogger(__name__)
 
 async def get_db() -> AsyncGenerator[asyncpg.Connection, None]:
-    """Get database connection."""
-    logger.info(f"Attempting to connect to database with URL: {settings.DATABASE_URL}")
+    """Lease a database connection from the process-wide pool."""
+    pool = get_pool()
     try:
-        conn = await asyncpg.connect(settings.DATABASE_URL)
-        logger.info("Database connection established successfully")
-        try:
-            yield conn
-        finally:
-            logger.info("Closing database connection")
-            await conn.close()
-    except Exception as e:
-        logger.error(f"Database connection error: {str(e)}")
-        raise
+        conn = await pool.lease()
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is busy, please retry"
+        )
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+async def get_read_db() -> AsyncGenerator[asyncpg.Connection, None]:
+    """Lease a connection for read-only work, from a replica when one is configured."""
+    try:
+        conn, pool = await db_router.lease_read()
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database is busy, please retry"
+        )
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
 
 async def init_db():
     """Initialize database with required tables."""
@@ -0,0 +1,96 @@
+import asyncpg
+import time
+from typing import Any, Dict, List, Optional
+
+
+class StatementStats:
+    """Execution counters for one registered statement."""
+
+    __slots__ = ('calls', 'errors', 'total_seconds', 'max_seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, elapsed: float, failed: bool = False) -> None:
+        self.calls += 1
+        if failed:
+            self.errors += 1
+        self.total_seconds += elapsed
+        if elapsed > self.max_seconds:
+            self.max_seconds = elapsed
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "avg_ms": round(self.total_seconds * 1000 / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 3),
+        }
+
+
+class StatementRegistry:
+    """
+    Named SQL statements with per-statement usage counters.
+
+    Statements are registered at import time by the modules that own them and
+    executed by name. Nothing is prepared eagerly: the registry only maps
+    names to SQL, sends that SQL through asyncpg's implicit per-connection
+    statement cache and counts calls, errors and timings. The cache is keyed
+    by SQL text and survives pool releases, so each statement is parsed once
+    per physical connection; the pool sizes `statement_cache_size` from
+    `len(statements)` so every registered statement fits.
+    """
+
+    def __init__(self):
+        self._sql: Dict[str, str] = {}
+        self._stats: Dict[str, StatementStats] = {}
+
+    def register(self, name: str, sql: str) -> str:
+        """Register `sql` under `name` and return the name as a handle."""
+        existing = self._sql.get(name)
+        if existing is not None and existing != sql:
+            raise ValueError(f"Statement '{name}' is already registered with different SQL")
+        self._sql[name] = sql
+        self._stats.setdefault(name, StatementStats())
+        return name
+
+    def sql(self, name: str) -> str:
+        return self._sql[name]
+
+    def __len__(self) -> int:
+        return len(self._sql)
+
+    async def _run(self, conn: asyncpg.Connection, name: str, method: str, args: tuple) -> Any:
+        stats = self._stats[name]
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await getattr(conn, method)(self._sql[name], *args)
+            failed = False
+            return result
+        finally:
+            stats.record(time.perf_counter() - started, failed=failed)
+
+    async def fetch(self, conn: asyncpg.Connection, name: str, *args) -> List[asyncpg.Record]:
+        return await self._run(conn, name, 'fetch', args)
+
+    async def fetchrow(self, conn: asyncpg.Connection, name: str, *args) -> Optional[asyncpg.Record]:
+        return await self._run(conn, name, 'fetchrow', args)
+
+    async def fetchval(self, conn: asyncpg.Connection, name: str, *args) -> Any:
+        return await self._run(conn, name, 'fetchval', args)
+
+    async def execute(self, conn: asyncpg.Connection, name: str, *args) -> str:
+        """Run a statement that returns no rows and return its status tag."""
+        return await self._run(conn, name, 'execute', args)
+
+    def stats(self) -> Dict[str, dict]:
+        """Return execution counters for every statement that has been run."""
+        return {name: stats.as_dict() for name, stats in self._stats.items() if stats.calls}
+
+
+statements = StatementRegistry()
@@ -2,9 +2,21 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.api.v1.api import api_router
+from app.core.email_dispatcher import email_dispatcher
+from app.core.email_templates import load_email_templates
+from app.core.google import google_verifier
+from app.core.jwt_keys import get_key_ring
+from app.core.rate_limit import login_limiter
+from app.core.revocation import revocation_list
+from app.core.security import get_hash_pool_stats, start_hash_pool, shutdown_hash_pool, token_claims_cache
+from app.core.smtp_pool import smtp_pool
 from app.db.init_db import init_db
+from app.db.pool import init_pools, close_pools, get_pool_stats
+from app.db.routing import db_router
+from app.db.statements import statements
+from app.models.user import user_cache
 import logging
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exception_handlers import RequestValidationError
 from fastapi.exceptions import RequestValidationError
 
@@ -31,17 +43,66 @@ app.include_router(api_router, prefix="/api/v1")
 
 @app.on_event("startup")
 async def startup_event():
-    """Run database migrations on startup."""
+    """Load the JWT keys and email templates, open the connection pool, bring the schema up to date, load token revocations and start the hashing workers and SMTP keepalive."""
+    get_key_ring()
+    load_email_templates()
     try:
+        await init_pools()
         await init_db()
+        await revocation_list.start()
     except Exception as e:
         logger.error(f"Failed to initialize database: {str(e)}")
         raise
+    await start_hash_pool()
+    smtp_pool.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks and close the connection pools, password hashing workers and HTTP clients on shutdown."""
+    await revocation_list.stop()
+    await close_pools()
+    shutdown_hash_pool()
+    await google_verifier.close()
+    await email_dispatcher.close()
+    await smtp_pool.stop()
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to Jesi AI API"}
 
+@app.get("/.well-known/jwks.json")
+async def jwks(request: Request):
+    """Public keys for verifying access tokens; empty when tokens are HS256."""
+    key_ring = get_key_ring()
+    if key_ring is None:
+        body, etag = b'{"keys":[]}', '"empty"'
+    else:
+        body, etag = key_ring.jwks_body, key_ring.jwks_etag
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.JWKS_MAX_AGE_SECONDS}",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/metrics")
+async def metrics():
+    """Runtime counters for database access, password hashing, caches, authentication and outbound mail."""
+    return {
+        "db_pools": get_pool_stats(),
+        "db_routing": db_router.stats(),
+        "db_statements": statements.stats(),
+        "password_hashing": get_hash_pool_stats(),
+        "user_cache": user_cache.stats(),
+        "token_claims_cache": token_claims_cache.stats(),
+        "google_auth": google_verifier.stats(),
+        "token_revocation": revocation_list.stats(),
+        "login_throttle": login_limiter.stats(),
+        "smtp_pool": smtp_pool.stats(),
+        "email_dispatch": email_dispatcher.stats(),
+    }
+
 @app.exception_handler(RequestValidationError)
 async def custom_validation_exception_handler(request: Request, exc: RequestValidationError):
     # Check if the error is for password length
@@ -0,0 +1,95 @@
+import asyncpg
+import json
+import logging
+from typing import List, Sequence, Tuple
+from app.db.statements import statements
+
+logger = logging.getLogger(__name__)
+
+# Mailer processes LISTEN on this channel; enqueueing notifies it on commit
+OUTBOX_CHANNEL = "email_outbox"
+
+ENQUEUE = statements.register("email_outbox_enqueue", """
+    WITH inserted AS (
+        INSERT INTO email_outbox (kind, recipient, payload)
+        SELECT kind, recipient, payload::jsonb
+        FROM unnest($1::varchar[], $2::varchar[], $3::text[]) AS m(kind, recipient, payload)
+        RETURNING id
+    )
+    SELECT count(*), pg_notify('""" + OUTBOX_CHANNEL + """', '') FROM inserted
+""")
+# Claimed rows are leased by pushing available_at into the future, so a
+# mailer that dies mid-batch only delays its rows until the lease runs out
+CLAIM = statements.register("email_outbox_claim", """
+    UPDATE email_outbox
+    SET attempts = attempts + 1,
+        available_at = CURRENT_TIMESTAMP + make_interval(secs => $2)
+    WHERE id IN (
+        SELECT id FROM email_outbox
+        WHERE status = 'pending' AND available_at <= CURRENT_TIMESTAMP
+        ORDER BY available_at, id
+        LIMIT $1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, kind, recipient, payload, attempts
+""")
+MARK_SENT = statements.register("email_outbox_mark_sent", """
+    UPDATE email_outbox
+    SET status = 'sent', sent_at = CURRENT_TIMESTAMP, last_error = NULL
+    WHERE id = ANY($1::bigint[])
+""")
+MARK_FAILED = statements.register("email_outbox_mark_failed", """
+    UPDATE email_outbox
+    SET status = CASE WHEN $3 THEN 'failed' ELSE 'pending' END,
+        last_error = $2,
+        available_at = CURRENT_TIMESTAMP + make_interval(secs => $4)
+    WHERE id = $1
+""")
+DELETE_SENT = statements.register("email_outbox_delete_sent", """
+    DELETE FROM email_outbox
+    WHERE status = 'sent' AND sent_at < CURRENT_TIMESTAMP - make_interval(days => $1)
+""")
+
+
+class EmailOutbox:
+    """Emails waiting to be sent by the mailer worker (app.workers.mailer)."""
+
+    @staticmethod
+    async def enqueue(db: asyncpg.Connection, messages: Sequence[Tuple[str, str, dict]]) -> None:
+        """
+        Queue (kind, recipient, payload) messages. Call it inside the
+        transaction that makes them necessary, so they are sent if and only
+        if it commits.
+        """
+        if not messages:
+            return
+        try:
+            await statements.fetchrow(
+                db,
+                ENQUEUE,
+                [kind for kind, _, _ in messages],
+                [recipient for _, recipient, _ in messages],
+                [json.dumps(payload) for _, _, payload in messages],
+            )
+        except Exception as e:
+            logger.error(f"Error queueing emails: {str(e)}")
+            raise
+
+    @staticmethod
+    async def claim(db: asyncpg.Connection, limit: int, lease_seconds: float) -> List[asyncpg.Record]:
+        """Lease up to `limit` due messages; rows leased by other mailers are skipped."""
+        return await statements.fetch(db, CLAIM, limit, float(lease_seconds))
+
+    @staticmethod
+    async def mark_sent(db: asyncpg.Connection, ids: Sequence[int]) -> None:
+        if ids:
+            await statements.execute(db, MARK_SENT, list(ids))
+
+    @staticmethod
+    async def mark_failed(db: asyncpg.Connection, id: int, error: str, give_up: bool, retry_in: float) -> None:
+        await statements.execute(db, MARK_FAILED, id, error, give_up, float(retry_in))
+
+    @staticmethod
+    async def delete_sent(db: asyncpg.Connection, older_than_days: int) -> int:
+        status = await statements.execute(db, DELETE_SENT, older_than_days)
+        return int(status.split()[-1])
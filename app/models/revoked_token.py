@@ -0,0 +1,48 @@
+import asyncpg
+import logging
+from datetime import datetime
+from typing import List, Optional
+from app.db.statements import statements
+
+logger = logging.getLogger(__name__)
+
+REVOKE_TOKEN = statements.register("revoked_token_insert", """
+    INSERT INTO revoked_tokens (jti, user_id, expires_at)
+    VALUES ($1, $2, $3)
+    ON CONFLICT (jti) DO NOTHING
+""")
+GET_ACTIVE = statements.register("revoked_token_get_active", """
+    SELECT jti, expires_at, revoked_at FROM revoked_tokens
+    WHERE expires_at > CURRENT_TIMESTAMP
+""")
+GET_REVOKED_SINCE = statements.register("revoked_token_get_since", """
+    SELECT jti, expires_at, revoked_at FROM revoked_tokens
+    WHERE revoked_at >= $1 AND expires_at > CURRENT_TIMESTAMP
+""")
+DELETE_EXPIRED = statements.register("revoked_token_delete_expired", """
+    DELETE FROM revoked_tokens WHERE expires_at <= CURRENT_TIMESTAMP
+""")
+
+
+class RevokedToken:
+    """Access tokens (by jti) that must be rejected until they expire."""
+
+    @staticmethod
+    async def revoke(db: asyncpg.Connection, jti: str, user_id, expires_at: datetime) -> None:
+        try:
+            await statements.execute(db, REVOKE_TOKEN, jti, user_id, expires_at)
+        except Exception as e:
+            logger.error(f"Error revoking token: {str(e)}")
+            raise
+
+    @staticmethod
+    async def get_revoked(db: asyncpg.Connection, since: Optional[datetime] = None) -> List[asyncpg.Record]:
+        """Unexpired revocations, optionally only those recorded at or after `since`."""
+        if since is None:
+            return await statements.fetch(db, GET_ACTIVE)
+        return await statements.fetch(db, GET_REVOKED_SINCE, since)
+
+    @staticmethod
+    async def delete_expired(db: asyncpg.Connection) -> int:
+        status = await statements.execute(db, DELETE_EXPIRED)
+        return int(status.split()[-1])
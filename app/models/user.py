@@ -1,15 +1,99 @@
 import asyncpg
 import logging
 from datetime import datetime
-from typing import Optional
-from app.core.security import get_password_hash, verify_password
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.security import aget_password_hash, averify_password
+from app.db.routing import db_router
+from app.db.statements import statements
 from sqlalchemy import Column, String, Boolean, DateTime, func
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 
 logger = logging.getLogger(__name__)
 
+# Rows of recently authenticated users, keyed by str(id); see User.get_by_id_cached
+user_cache = TTLCache(settings.USER_CACHE_MAX_SIZE, settings.USER_CACHE_TTL_SECONDS)
+
+
+def _record_write(user_id) -> None:
+    """Called after every write to a user row: pin reads to the primary and drop the cached row."""
+    db_router.record_write(user_id)
+    user_cache.invalidate(str(user_id))
+
+
+# Column order shared by every statement that returns a full user row, so
+# rows can be mapped onto User positionally (see User.from_record).
+USER_COLUMNS = (
+    'id', 'first_name', 'last_name', 'email', 'hashed_password', 'role', 'is_active', 'is_verified',
+    'verification_token', 'reset_token', 'created_at', 'updated_at', 'last_login', 'last_logout', 'provider',
+)
+_RETURNING_USER = ", ".join(USER_COLUMNS)
+_SELECT_USER = f"SELECT {_RETURNING_USER} FROM users "
+
+INSERT_USER = statements.register("user_insert", """
+    INSERT INTO users (id, email, first_name, last_name, hashed_password, role, provider, is_verified)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    RETURNING """ + _RETURNING_USER)
+GET_BY_EMAIL = statements.register("user_get_by_email", _SELECT_USER + "WHERE email = $1")
+GET_BY_ID = statements.register("user_get_by_id", _SELECT_USER + "WHERE id = $1")
+GET_MANY_BY_IDS = statements.register("user_get_many_by_ids", _SELECT_USER + "WHERE id = ANY($1::uuid[])")
+GET_MANY_BY_EMAILS = statements.register("user_get_many_by_emails", _SELECT_USER + "WHERE email = ANY($1::varchar[])")
+VERIFY_USER = statements.register("user_verify", """
+    UPDATE users
+    SET is_verified = true,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = $1
+""")
+RESET_PASSWORD = statements.register("user_reset_password", """
+    UPDATE users
+    SET hashed_password = $1,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = $2
+""")
+# Only replaces the hash it was computed from, so a concurrent password reset wins
+UPGRADE_PASSWORD_HASH = statements.register("user_upgrade_password_hash", """
+    UPDATE users
+    SET hashed_password = $1,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = $2 AND hashed_password = $3
+""")
+# Columns that may be returned by the admin listing; secrets are never listed.
+LISTABLE_COLUMNS = (
+    'id', 'first_name', 'last_name', 'email', 'role', 'is_active', 'is_verified', 'provider',
+    'created_at', 'updated_at', 'last_login', 'last_logout',
+)
+
+# Columns that `save` writes; id is the key and the timestamps are managed by
+# the database. The token columns are no longer written: verification and
+# reset links are signed tokens (see app.core.tokens).
+_WRITABLE_COLUMNS = tuple(
+    c for c in USER_COLUMNS if c not in ('id', 'created_at', 'updated_at', 'verification_token', 'reset_token')
+)
+_WRITABLE_COLUMN_SET = frozenset(_WRITABLE_COLUMNS)
+UPSERT_USER = statements.register("user_upsert", f"""
+    INSERT INTO users (id, {", ".join(_WRITABLE_COLUMNS)}, created_at, updated_at)
+    VALUES ({", ".join(f"${i}" for i in range(1, len(_WRITABLE_COLUMNS) + 4))})
+    ON CONFLICT (id) DO UPDATE
+    SET {", ".join(f"{c} = EXCLUDED.{c}" for c in _WRITABLE_COLUMNS)},
+        updated_at = CURRENT_TIMESTAMP
+""")
+
+
+def _update_statement(columns) -> str:
+    """Register (once) and return the UPDATE statement for a set of dirty columns."""
+    assignments = ", ".join(f"{c} = ${i}" for i, c in enumerate(columns, start=1))
+    return statements.register(
+        "user_update:" + ",".join(columns),
+        f"UPDATE users SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ${len(columns) + 1}"
+    )
+
 class User:
+    # `_dirty` holds the writable columns assigned since the row was loaded or
+    # last saved; `_persisted` is False until the row is known to exist.
+    __slots__ = USER_COLUMNS + ('_dirty', '_persisted')
+
     def __init__(
         self,
         id: str,
@@ -17,7 +101,7 @@ class User:
         last_name: str,
         email: str,
         hashed_password: str,
-        role: Optional[str] = None,
+        role: str = 'user',
         is_active: bool = True,
         is_verified: bool = False,
         verification_token: Optional[str] = None,
@@ -26,8 +110,10 @@ class User:
         updated_at: Optional[datetime] = None,
         last_login: Optional[datetime] = None,
         last_logout: Optional[datetime] = None,
-        provider: Optional[str] = None
+        provider: str = 'email'
     ):
+        object.__setattr__(self, '_dirty', set())
+        object.__setattr__(self, '_persisted', False)
         self.id = id
         self.first_name = first_name
         self.last_name = last_name
@@ -45,33 +131,46 @@ class User:
         self.provider = provider
 
     @classmethod
-    async def create(cls, db: asyncpg.Connection, email: str, first_name: str, last_name: str, password: str, role: str = 'user', provider: str = 'email') -> 'User':
-        """Create a new user."""
+    def from_record(cls, record) -> 'User':
+        """Build a User from a row selected with USER_COLUMNS, without copying it into a dict."""
+        user = cls.__new__(cls)
+        for name, value in zip(USER_COLUMNS, record):
+            object.__setattr__(user, name, value)
+        object.__setattr__(user, '_dirty', set())
+        object.__setattr__(user, '_persisted', True)
+        return user
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in _WRITABLE_COLUMN_SET:
+            self._dirty.add(name)
+
+    @property
+    def dirty_fields(self) -> frozenset:
+        """Columns changed since the user was loaded or last saved."""
+        return frozenset(self._dirty)
+
+    @classmethod
+    async def create(cls, db: asyncpg.Connection, email: str, first_name: str, last_name: str, password: str, role: str = 'user', provider: str = 'email', is_verified: bool = False) -> 'User':
+        """Create a new user; verification links are signed tokens, see app.core.tokens."""
         try:
             logger.info("Starting user creation process...")
-            hashed_password = get_password_hash(password)
-            verification_token = cls.generate_verification_token()
+            hashed_password = await aget_password_hash(password)
             user_id = str(uuid.uuid4())  # Generate UUID for the id field
             
-            query = """
-                INSERT INTO users (id, email, first_name, last_name, hashed_password, role, verification_token, provider)
-                VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-                RETURNING id, email, first_name, last_name, hashed_password, role, is_active, is_verified,
-                         verification_token, reset_token, created_at, updated_at, last_login, last_logout, provider
-            """
-            
             logger.info("Executing database query...")
             try:
-                row = await db.fetchrow(
-                    query,
+                row = await statements.fetchrow(
+                    db,
+                    INSERT_USER,
                     user_id,  # Use the generated UUID
                     email,
                     first_name,
                     last_name,
                     hashed_password,
                     role,
-                    verification_token,
-                    provider
+                    provider,
+                    is_verified
                 )
                 logger.info("Database query executed successfully")
             except Exception as db_error:
@@ -83,23 +182,8 @@ class User:
                 raise Exception("Failed to create user: No data returned")
             
             logger.info(f"User created successfully with ID: {row['id']}")
-            return cls(
-                id=row['id'],
-                email=row['email'],
-                first_name=row['first_name'],
-                last_name=row['last_name'],
-                hashed_password=row['hashed_password'],
-                role=row['role'],
-                is_active=row['is_active'],
-                is_verified=row['is_verified'],
-                verification_token=row['verification_token'],
-                reset_token=row['reset_token'],
-                created_at=row['created_at'],
-                updated_at=row['updated_at'],
-                last_login=row['last_login'],
-                last_logout=row['last_logout'],
-                provider=row['provider']
-            )
+            _record_write(row['id'])
+            return cls.from_record(row)
         except Exception as e:
             logger.error(f"Error creating user: {str(e)}", exc_info=True)
             raise
@@ -108,251 +192,203 @@ class User:
     async def get_by_email(cls, db: asyncpg.Connection, email: str) -> Optional['User']:
         """Get a user by email."""
         try:
-            query = """
-                SELECT id, first_name, last_name, email, hashed_password, role, is_active, is_verified,
-                       verification_token, reset_token, created_at, updated_at, last_login, last_logout
-                FROM users
-                WHERE email = $1
-            """
-            row = await db.fetchrow(query, email)
+            row = await statements.fetchrow(db, GET_BY_EMAIL, email)
             
             if row:
-                return cls(
-                    id=row['id'],
-                    first_name=row['first_name'],
-                    last_name=row['last_name'],
-                    email=row['email'],
-                    hashed_password=row['hashed_password'],
-                    role=row['role'],
-                    is_active=row['is_active'],
-                    is_verified=row['is_verified'],
-                    verification_token=row['verification_token'],
-                    reset_token=row['reset_token'],
-                    created_at=row['created_at'],
-                    updated_at=row['updated_at'],
-                    last_login=row['last_login'],
-                    last_logout=row['last_logout']
-                )
+                return cls.from_record(row)
             return None
         except Exception as e:
             logger.error(f"Error getting user by email: {str(e)}")
             raise
 
     @classmethod
-    async def get_by_verification_token(cls, db: asyncpg.Connection, token: str) -> Optional['User']:
-        """Get a user by verification token."""
+    async def get_by_id_cached(cls, user_id) -> Optional['User']:
+        """
+        Get a user by ID through the in-process user cache.
+
+        On a miss the row is read through the read router and cached; every
+        hit builds a fresh User, so callers may modify it freely.
+        """
+        key = str(user_id)
+        row = user_cache.get(key)
+        if row is None:
+            version = user_cache.version
+            try:
+                async with db_router.read(key) as db:
+                    row = await statements.fetchrow(db, GET_BY_ID, user_id)
+            except Exception as e:
+                logger.error(f"Error getting user by ID: {str(e)}")
+                raise
+            if row is None:
+                return None
+            user_cache.set(key, row, version=version)
+        return cls.from_record(row)
+
+    @classmethod
+    async def get_by_id(cls, db: asyncpg.Connection, user_id: str) -> Optional['User']:
+        """Get a user by ID."""
         try:
-            query = """
-                SELECT id, first_name, last_name, email, hashed_password, role, is_active, is_verified,
-                       verification_token, reset_token, created_at, updated_at, last_login, last_logout
-                FROM users
-                WHERE verification_token = $1
-            """
-            row = await db.fetchrow(query, token)
+            row = await statements.fetchrow(db, GET_BY_ID, user_id)
             
             if row:
-                return cls(
-                    id=row['id'],
-                    first_name=row['first_name'],
-                    last_name=row['last_name'],
-                    email=row['email'],
-                    hashed_password=row['hashed_password'],
-                    role=row['role'],
-                    is_active=row['is_active'],
-                    is_verified=row['is_verified'],
-                    verification_token=row['verification_token'],
-                    reset_token=row['reset_token'],
-                    created_at=row['created_at'],
-                    updated_at=row['updated_at'],
-                    last_login=row['last_login'],
-                    last_logout=row['last_logout']
-                )
+                return cls.from_record(row)
             return None
         except Exception as e:
-            logger.error(f"Error getting user by verification token: {str(e)}")
+            logger.error(f"Error getting user by ID: {str(e)}")
             raise
 
     @classmethod
-    async def get_by_reset_token(cls, db: asyncpg.Connection, token: str) -> Optional['User']:
-        """Get a user by reset token."""
+    async def get_many_by_ids(cls, db: asyncpg.Connection, user_ids: Sequence) -> List[Optional['User']]:
+        """
+        Get many users by ID in one query.
+
+        Returns one entry per input ID, in input order, with None for IDs
+        that do not exist.
+        """
         try:
-            query = """
-                SELECT id, first_name, last_name, email, hashed_password, role, is_active, is_verified,
-                       verification_token, reset_token, created_at, updated_at, last_login, last_logout
-                FROM users
-                WHERE reset_token = $1
-            """
-            row = await db.fetchrow(query, token)
-            
-            if row:
-                return cls(
-                    id=row['id'],
-                    first_name=row['first_name'],
-                    last_name=row['last_name'],
-                    email=row['email'],
-                    hashed_password=row['hashed_password'],
-                    role=row['role'],
-                    is_active=row['is_active'],
-                    is_verified=row['is_verified'],
-                    verification_token=row['verification_token'],
-                    reset_token=row['reset_token'],
-                    created_at=row['created_at'],
-                    updated_at=row['updated_at'],
-                    last_login=row['last_login'],
-                    last_logout=row['last_logout']
-                )
-            return None
+            keys = [key if isinstance(key, uuid.UUID) else uuid.UUID(str(key)) for key in user_ids]
+            if not keys:
+                return []
+            rows = await statements.fetch(db, GET_MANY_BY_IDS, list(set(keys)))
+            found = {row['id']: cls.from_record(row) for row in rows}
+            return [found.get(key) for key in keys]
         except Exception as e:
-            logger.error(f"Error getting user by reset token: {str(e)}")
+            logger.error(f"Error getting users by IDs: {str(e)}")
             raise
 
     @classmethod
-    async def get_by_id(cls, db: asyncpg.Connection, user_id: str) -> Optional['User']:
-        """Get a user by ID."""
+    async def get_many_by_emails(cls, db: asyncpg.Connection, emails: Sequence[str]) -> List[Optional['User']]:
+        """
+        Get many users by email in one query.
+
+        Returns one entry per input email, in input order, with None for
+        emails that are not registered.
+        """
         try:
-            query = """
-                SELECT id, first_name, last_name, email, hashed_password, role, is_active, is_verified,
-                       verification_token, reset_token, created_at, updated_at, last_login, last_logout
-                FROM users
-                WHERE id = $1
-            """
-            row = await db.fetchrow(query, user_id)
-            
-            if row:
-                return cls(
-                    id=row['id'],
-                    first_name=row['first_name'],
-                    last_name=row['last_name'],
-                    email=row['email'],
-                    hashed_password=row['hashed_password'],
-                    role=row['role'],
-                    is_active=row['is_active'],
-                    is_verified=row['is_verified'],
-                    verification_token=row['verification_token'],
-                    reset_token=row['reset_token'],
-                    created_at=row['created_at'],
-                    updated_at=row['updated_at'],
-                    last_login=row['last_login'],
-                    last_logout=row['last_logout']
-                )
-            return None
+            if not emails:
+                return []
+            rows = await statements.fetch(db, GET_MANY_BY_EMAILS, list(set(emails)))
+            found = {row['email']: cls.from_record(row) for row in rows}
+            return [found.get(email) for email in emails]
         except Exception as e:
-            logger.error(f"Error getting user by ID: {str(e)}")
+            logger.error(f"Error getting users by emails: {str(e)}")
             raise
 
+    @staticmethod
+    async def iter_page(
+        db: asyncpg.Connection,
+        columns: Sequence[str] = LISTABLE_COLUMNS,
+        limit: int = 100,
+        after: Optional[Tuple[datetime, uuid.UUID]] = None,
+        role: Optional[str] = None,
+        is_verified: Optional[bool] = None,
+        provider: Optional[str] = None,
+        prefetch: int = 100
+    ) -> AsyncIterator[asyncpg.Record]:
+        """
+        Stream one page of users ordered by (created_at, id) from a server-side cursor.
+
+        Keyset pagination: `after` is the (created_at, id) of the last row of
+        the previous page, so every page is an index range scan on
+        idx_users_created_at_id no matter how deep it is. Rows always include
+        id and created_at. Must be called inside a transaction.
+        """
+        unknown = set(columns) - set(LISTABLE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Cannot list columns: {', '.join(sorted(unknown))}")
+        selected = list(dict.fromkeys(['id', 'created_at', *columns]))
+
+        conditions, args = [], []
+        if after is not None:
+            args.extend(after)
+            conditions.append(f"(created_at, id) > (${len(args) - 1}, ${len(args)})")
+        for column, value in (('role', role), ('is_verified', is_verified), ('provider', provider)):
+            if value is not None:
+                args.append(value)
+                conditions.append(f"{column} = ${len(args)}")
+        args.append(limit)
+        query = (
+            f"SELECT {', '.join(selected)} FROM users "
+            + (f"WHERE {' AND '.join(conditions)} " if conditions else "")
+            + f"ORDER BY created_at, id LIMIT ${len(args)}"
+        )
+        async for record in db.cursor(query, *args, prefetch=prefetch):
+            yield record
+
     async def verify(self, db: asyncpg.Connection) -> None:
         """Verify a user's email."""
         try:
-            query = """
-                UPDATE users
-                SET is_verified = true,
-                    verification_token = NULL,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = $1
-            """
-            await db.execute(query, self.id)
+            await statements.execute(db, VERIFY_USER, self.id)
+            _record_write(self.id)
             self.is_verified = True
-            self.verification_token = None
+            self._dirty.discard('is_verified')
         except Exception as e:
             logger.error(f"Error verifying user: {str(e)}")
             raise
 
-    async def set_reset_token(self, db: asyncpg.Connection, token: str) -> None:
-        """Set a password reset token."""
-        try:
-            query = """
-                UPDATE users
-                SET reset_token = $1,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = $2
-            """
-            await db.execute(query, token, self.id)
-            self.reset_token = token
-        except Exception as e:
-            logger.error(f"Error setting reset token: {str(e)}")
-            raise
-
     async def reset_password(self, db: asyncpg.Connection, new_password: str) -> None:
         """Reset a user's password."""
         try:
-            hashed_password = get_password_hash(new_password)
-            query = """
-                UPDATE users
-                SET hashed_password = $1,
-                    reset_token = NULL,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = $2
-            """
-            await db.execute(query, hashed_password, self.id)
+            hashed_password = await aget_password_hash(new_password)
+            await statements.execute(db, RESET_PASSWORD, hashed_password, self.id)
+            _record_write(self.id)
             self.hashed_password = hashed_password
-            self.reset_token = None
+            self._dirty.discard('hashed_password')
         except Exception as e:
             logger.error(f"Error resetting password: {str(e)}")
             raise
 
-    def check_password(self, password: str) -> bool:
-        """Check if the provided password matches the hashed password."""
-        return verify_password(password, self.hashed_password)
+    async def upgrade_password_hash(self, db: asyncpg.Connection, password: str) -> bool:
+        """
+        Rehash a verified password with the current scheme and cost.
 
-    @staticmethod
-    def generate_verification_token() -> str:
-        """Generate a verification token."""
-        import secrets
-        return secrets.token_urlsafe(32)
+        Returns False if the stored hash changed in the meantime.
+        """
+        try:
+            old_hash = self.hashed_password
+            new_hash = await aget_password_hash(password)
+            status = await statements.execute(db, UPGRADE_PASSWORD_HASH, new_hash, self.id, old_hash)
+            if status != "UPDATE 1":
+                return False
+            _record_write(self.id)
+            object.__setattr__(self, 'hashed_password', new_hash)
+            self._dirty.discard('hashed_password')
+            return True
+        except Exception as e:
+            logger.error(f"Error upgrading password hash: {str(e)}")
+            raise
+
+    async def check_password(self, password: str) -> bool:
+        """Check if the provided password matches the hashed password."""
+        return await averify_password(password, self.hashed_password)
 
     async def save(self, conn: asyncpg.Connection) -> None:
+        """
+        Persist the user in a single statement.
+
+        New users are upserted with every column; loaded users only send
+        the columns that were assigned since they were loaded.
+        """
         try:
-            # Check if user exists
-            existing_user = await self.get_by_email(conn, self.email)
-            
-            if existing_user:
-                logger.info(f"Updating existing user with ID: {self.id}")
-                # Update existing user
-                await conn.execute('''
-                    UPDATE users 
-                    SET first_name = $1,
-                        last_name = $2,
-                        email = $3,
-                        hashed_password = $4,
-                        role = $5,
-                        is_active = $6,
-                        is_verified = $7,
-                        verification_token = $8,
-                        reset_token = $9,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE id = $10
-                ''', self.first_name, self.last_name, self.email, self.hashed_password,
-                    self.role, self.is_active, self.is_verified,
-                    self.verification_token, self.reset_token, self.id)
-                logger.info(f"User updated successfully with ID: {self.id}")
+            if not self._persisted:
+                logger.info(f"Upserting user with ID: {self.id}")
+                await statements.execute(
+                    conn, UPSERT_USER,
+                    self.id, *(getattr(self, c) for c in _WRITABLE_COLUMNS),
+                    self.created_at, self.updated_at)
+                self._persisted = True
+            elif self._dirty:
+                columns = [c for c in _WRITABLE_COLUMNS if c in self._dirty]
+                logger.info(f"Updating {', '.join(columns)} for user with ID: {self.id}")
+                await statements.execute(
+                    conn, _update_statement(columns),
+                    *(getattr(self, c) for c in columns), self.id)
             else:
-                logger.info(f"Creating new user with ID: {self.id}")
-                # Insert new user
-                await conn.execute('''
-                    INSERT INTO users (
-                        id, first_name, last_name, email, hashed_password, role,
-                        is_active, is_verified, verification_token,
-                        reset_token, created_at, updated_at
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
-                ''', self.id, self.first_name, self.last_name, self.email, self.hashed_password, self.role,
-                    self.is_active, self.is_verified, self.verification_token,
-                    self.reset_token, self.created_at, self.updated_at)
-                logger.info(f"User created successfully with ID: {self.id}")
+                logger.info(f"No changes to save for user with ID: {self.id}")
+                return
+            self._dirty.clear()
+            _record_write(self.id)
+            logger.info(f"User saved successfully with ID: {self.id}")
         except Exception as e:
             logger.error(f"Error saving user: {str(e)}")
             raise
-
-    @classmethod
-    async def update_verification_token(cls, db: asyncpg.Connection, user_id: UUID, token: str) -> None:
-        """Update the verification token for a user."""
-        try:
-            query = """
-                UPDATE users
-                SET verification_token = $1
-                WHERE id = $2
-            """
-            await db.execute(query, token, user_id)
-            logger.info(f"Verification token updated for user ID: {user_id}")
-        except Exception as e:
-            logger.error(f"Error updating verification token: {str(e)}")
-            raise 
\ No newline at end of file
@@ -1,8 +1,9 @@
 from pydantic import BaseModel, EmailStr, constr, validator
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 import re
 from uuid import UUID
+from app.core.config import settings
 
 class UserBase(BaseModel):
     first_name: str
@@ -72,4 +73,24 @@ class RoleAssignment(BaseModel):
 
 class GoogleAuth(BaseModel):
     """Schema for Google authentication."""
-    token: str  # The Google OAuth token from the frontend 
\ No newline at end of file
+    token: str  # The Google OAuth token from the frontend
+
+class UserBatchLookup(BaseModel):
+    """Users to resolve by ID and/or email in a single request."""
+    ids: List[UUID] = []
+    emails: List[EmailStr] = []
+
+    @validator('emails', always=True)
+    def batch_size(cls, v, values):
+        total = len(v) + len(values.get('ids', []))
+        if total > settings.BATCH_LOOKUP_MAX_SIZE:
+            raise ValueError(f'At most {settings.BATCH_LOOKUP_MAX_SIZE} users can be looked up at once')
+        return v
+
+class UserLookupResult(BaseModel):
+    key: str
+    found: bool
+    user: Optional[UserResponse] = None
+
+class UserBatchLookupResponse(BaseModel):
+    results: List[UserLookupResult]
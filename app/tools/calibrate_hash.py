@@ -0,0 +1,109 @@
+"""
+Password hash cost calibration.
+
+    python -m app.tools.calibrate_hash --target-ms 250 [--scheme argon2]
+
+Times password hashing on this machine at increasing cost and recommends the
+highest cost that stays within the latency budget, printed as the settings
+to deploy. Run it on the hardware the API runs on.
+"""
+import argparse
+import logging
+import sys
+import time
+from typing import Callable, List, Optional, Tuple
+from app.core.config import settings
+from app.core.security import build_pwd_context
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SAMPLE_PASSWORD = "correct horse battery staple"
+
+
+def time_hash(context_factory: Callable, samples: int) -> float:
+    """Median seconds to hash a password with the context built by `context_factory`."""
+    context = context_factory()
+    context.hash(SAMPLE_PASSWORD)  # load the backend outside the measurement
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash(SAMPLE_PASSWORD)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def calibrate_bcrypt(target: float, samples: int, max_rounds: int) -> Tuple[int, List[Tuple[int, float]]]:
+    # bcrypt doubles its work per round, so stop at the first cost over budget
+    results = []
+    best = 4
+    for rounds in range(4, max_rounds + 1):
+        seconds = time_hash(lambda: build_pwd_context("bcrypt", bcrypt_rounds=rounds), samples)
+        results.append((rounds, seconds))
+        if seconds > target:
+            break
+        best = rounds
+    return best, results
+
+
+def calibrate_argon2(target: float, samples: int, memory_cost: int, parallelism: int, max_time_cost: int) -> Tuple[int, List[Tuple[int, float]]]:
+    # Memory cost is fixed by the operator; the time cost is tuned to the budget
+    results = []
+    best = 1
+    for time_cost in range(1, max_time_cost + 1):
+        seconds = time_hash(
+            lambda: build_pwd_context(
+                "argon2",
+                argon2_time_cost=time_cost,
+                argon2_memory_cost=memory_cost,
+                argon2_parallelism=parallelism,
+            ),
+            samples,
+        )
+        results.append((time_cost, seconds))
+        if seconds > target:
+            break
+        best = time_cost
+    return best, results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Recommend a password hash cost for a latency budget.")
+    parser.add_argument("--target-ms", type=float, default=250, help="Latency budget for one hash in milliseconds")
+    parser.add_argument("--scheme", choices=("bcrypt", "argon2"), default=settings.PASSWORD_HASH_SCHEME)
+    parser.add_argument("--samples", type=int, default=5, help="Hashes timed per cost")
+    parser.add_argument("--max-rounds", type=int, default=16, help="Highest bcrypt cost to try")
+    parser.add_argument("--memory-cost", type=int, default=settings.ARGON2_MEMORY_COST, help="argon2 memory cost in KiB")
+    parser.add_argument("--parallelism", type=int, default=settings.ARGON2_PARALLELISM, help="argon2 lanes")
+    parser.add_argument("--max-time-cost", type=int, default=10, help="Highest argon2 time cost to try")
+    args = parser.parse_args(argv)
+
+    target = args.target_ms / 1000
+    if args.scheme == "bcrypt":
+        best, results = calibrate_bcrypt(target, args.samples, args.max_rounds)
+        label, current = "rounds", settings.BCRYPT_ROUNDS
+        recommended = {"PASSWORD_HASH_SCHEME": "bcrypt", "BCRYPT_ROUNDS": best}
+    else:
+        best, results = calibrate_argon2(target, args.samples, args.memory_cost, args.parallelism, args.max_time_cost)
+        label, current = "time cost", settings.ARGON2_TIME_COST
+        recommended = {
+            "PASSWORD_HASH_SCHEME": "argon2",
+            "ARGON2_TIME_COST": best,
+            "ARGON2_MEMORY_COST": args.memory_cost,
+            "ARGON2_PARALLELISM": args.parallelism,
+        }
+
+    for cost, seconds in results:
+        marker = " <- recommended" if cost == best else ""
+        logger.info(f"{args.scheme} {label} {cost:>2}: {seconds * 1000:8.1f} ms{marker}")
+    if results[0][1] > target:
+        logger.warning(f"Even the lowest {label} exceeds {args.target_ms:.0f} ms on this machine")
+    logger.info(f"Currently configured {label}: {current}")
+    for name, value in recommended.items():
+        print(f"{name}={value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
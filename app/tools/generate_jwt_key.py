@@ -0,0 +1,59 @@
+"""
+Generate a JWT signing key.
+
+    python -m app.tools.generate_jwt_key [--algorithm ES256] [--kid 2024-06] [--dir keys/jwt]
+
+Writes `<kid>.pem` (PKCS#8, readable by the owner only) into the key
+directory. A new key is only published: once the key directory holds more
+than one private key, JWT_SIGNING_KID must name the one that signs. Switch
+it to the new kid after downstream JWKS caches have refreshed; see
+app.core.jwt_keys.KeyRing for the rotation steps.
+"""
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+from typing import List, Optional
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from app.core.config import settings
+from app.core.jwt_keys import ASYMMETRIC_ALGORITHMS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def generate_private_key(algorithm: str):
+    if algorithm == "RS256":
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return ec.generate_private_key(ec.SECP256R1())
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate a JWT signing key.")
+    default_algorithm = settings.ALGORITHM if settings.ALGORITHM in ASYMMETRIC_ALGORITHMS else "ES256"
+    parser.add_argument("--algorithm", choices=ASYMMETRIC_ALGORITHMS, default=default_algorithm)
+    parser.add_argument("--kid", default=datetime.utcnow().strftime("%Y-%m-%d"), help="Key id (default: today's date)")
+    parser.add_argument("--dir", default=settings.JWT_KEYS_DIR, help="Key directory")
+    args = parser.parse_args(argv)
+
+    path = os.path.join(args.dir, f"{args.kid}.pem")
+    if os.path.exists(path):
+        logger.error(f"{path} already exists")
+        return 1
+    os.makedirs(args.dir, exist_ok=True)
+    pem = generate_private_key(args.algorithm).private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(pem)
+    logger.info(f"Wrote {args.algorithm} key '{args.kid}' to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+Bulk user import.
+
+    python -m app.tools.import_users users.csv [--verified] [--errors errors.jsonl]
+
+Reads CSV (header: email,first_name,last_name,password[,role]) or JSON Lines
+with the same keys, streaming, in chunks. Passwords are hashed across a
+process pool, each chunk is loaded with COPY into a temporary table and
+inserted with ON CONFLICT DO NOTHING. Verification emails for the inserted
+users are queued in the email outbox in the same transaction, for the
+mailer worker (python -m app.workers.mailer) to send.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+import asyncpg
+from pydantic import ValidationError
+from app.core.config import settings
+from app.core.email import VERIFICATION_EMAIL
+from app.core.security import get_password_hash
+from app.core.tokens import create_verification_token
+from app.models.email_outbox import EmailOutbox
+from app.schemas.user import UserCreate
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COPY_COLUMNS = [
+    'id', 'email', 'first_name', 'last_name', 'hashed_password', 'role',
+    'is_active', 'is_verified', 'provider',
+]
+
+
+class ImportReport:
+    """Counters and per-row errors for one import run."""
+
+    def __init__(self, errors_file=None):
+        self.started = time.monotonic()
+        self.read = 0
+        self.imported = 0
+        self.failed = 0
+        self.emails_queued = 0
+        self._errors_file = errors_file
+
+    def error(self, line: int, email: Optional[str], reason: str) -> None:
+        self.failed += 1
+        record = {"line": line, "email": email, "error": reason}
+        if self._errors_file:
+            self._errors_file.write(json.dumps(record) + "\n")
+        else:
+            logger.warning(f"Row {line} ({email}): {reason}")
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def progress(self) -> str:
+        rate = self.read / self.elapsed if self.elapsed else 0.0
+        return (
+            f"{self.read} read, {self.imported} imported, {self.failed} failed "
+            f"in {self.elapsed:.1f}s ({rate:.0f} rows/s)"
+        )
+
+
+def read_rows(path: str, fmt: str) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Yield (line number, row) pairs without loading the whole file."""
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, {"__error__": f"Invalid JSON: {e.msg}"}
+                    continue
+                if isinstance(row, dict):
+                    yield line_no, row
+                else:
+                    yield line_no, {"__error__": f"Expected a JSON object, got {type(row).__name__}"}
+
+
+def chunked(rows: Iterator, size: int) -> Iterator[List]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def load_chunk(
+    conn: asyncpg.Connection,
+    records: List[tuple],
+    tokens: Optional[Dict[str, str]] = None,
+) -> set:
+    """
+    COPY a chunk into a staging table and insert it; return the emails that
+    were inserted. Verification emails for inserted users with a token in
+    `tokens` are queued in the same transaction.
+    """
+    async with conn.transaction():
+        await conn.execute('''
+            CREATE TEMPORARY TABLE import_users
+            (LIKE users INCLUDING DEFAULTS) ON COMMIT DROP
+        ''')
+        await conn.copy_records_to_table('import_users', records=records, columns=COPY_COLUMNS)
+        columns = ", ".join(COPY_COLUMNS)
+        rows = await conn.fetch(f'''
+            INSERT INTO users ({columns})
+            SELECT {columns} FROM import_users
+            ON CONFLICT DO NOTHING
+            RETURNING email
+        ''')
+        inserted = {row['email'] for row in rows}
+        if tokens:
+            await EmailOutbox.enqueue(conn, [
+                (VERIFICATION_EMAIL, email, {"token": tokens[email]}) for email in inserted if tokens.get(email)
+            ])
+    return inserted
+
+
+async def import_users(
+    path: str,
+    fmt: str,
+    chunk_size: int,
+    workers: int,
+    role: str,
+    verified: bool,
+    send_emails: bool,
+    report: ImportReport,
+) -> None:
+    loop = asyncio.get_running_loop()
+    seen_emails = set()
+    conn = await asyncpg.connect(settings.DATABASE_URL)
+    send_emails = send_emails and not verified
+    try:
+        # Spawned, not forked: this process has a running event loop and an open connection
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            for chunk in chunked(read_rows(path, fmt), chunk_size):
+                valid = []
+                for line, row in chunk:
+                    report.read += 1
+                    if "__error__" in row:
+                        report.error(line, None, row["__error__"])
+                        continue
+                    try:
+                        user = UserCreate(**row)
+                    except (ValidationError, TypeError) as e:
+                        report.error(line, row.get('email'), str(e).replace("\n", " "))
+                        continue
+                    if user.email in seen_emails:
+                        report.error(line, user.email, "Duplicate email in import file")
+                        continue
+                    seen_emails.add(user.email)
+                    valid.append((line, user, row.get('role') or role))
+
+                if not valid:
+                    continue
+
+                hashes = await asyncio.gather(*(
+                    loop.run_in_executor(executor, get_password_hash, user.password)
+                    for _, user, _ in valid
+                ))
+
+                records, lines, tokens = [], {}, {}
+                for (line, user, user_role), hashed_password in zip(valid, hashes):
+                    user_id = uuid.uuid4()
+                    lines[user.email] = line
+                    if send_emails:
+                        tokens[user.email] = create_verification_token(user_id, user.email)
+                    records.append((
+                        user_id, user.email, user.first_name, user.last_name, hashed_password,
+                        user_role, verified, verified, 'email',
+                    ))
+
+                inserted = await load_chunk(conn, records, tokens)
+                report.imported += len(inserted)
+                if send_emails:
+                    report.emails_queued += len(inserted)
+                for email, line in lines.items():
+                    if email not in inserted:
+                        report.error(line, email, "Email already registered")
+                logger.info(report.progress())
+    finally:
+        await conn.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import users from CSV or JSON Lines.")
+    parser.add_argument("path", help="CSV or JSONL file to import")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="Input format (default: from the file extension)")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Rows per COPY batch")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Password hashing processes")
+    parser.add_argument("--role", default="user", help="Role for rows without a role column")
+    parser.add_argument("--verified", action="store_true", help="Mark users as verified and send no emails")
+    parser.add_argument("--no-email", action="store_true", help="Do not queue verification emails")
+    parser.add_argument("--errors", help="Write per-row errors to this JSONL file instead of the log")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("jsonl" if args.path.endswith((".jsonl", ".ndjson")) else "csv")
+    errors_file = open(args.errors, "w", encoding="utf-8") if args.errors else None
+    report = ImportReport(errors_file)
+    try:
+        asyncio.run(import_users(
+            args.path, fmt, args.chunk_size, args.workers, args.role,
+            args.verified, not args.no_email, report,
+        ))
+    finally:
+        if errors_file:
+            errors_file.close()
+    logger.info(f"Import finished: {report.progress()}")
+    if report.emails_queued:
+        logger.info(f"Verification emails: {report.emails_queued} queued in the outbox")
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
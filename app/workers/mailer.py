@@ -0,0 +1,191 @@
+"""
+Outbox mailer.
+
+    python -m app.workers.mailer [--batch-size 50] [--once]
+
+Sends the emails queued in the email_outbox table. Rows are claimed in
+batches with FOR UPDATE SKIP LOCKED, so any number of mailer processes can
+run side by side without sending a message twice. Failed sends are retried
+with exponential backoff up to MAILER_MAX_ATTEMPTS times, except when the
+server rejects every recipient outright. The worker sleeps
+until the API signals new rows (LISTEN/NOTIFY) or MAILER_POLL_SECONDS pass.
+If the database connection drops, the worker reconnects with backoff.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import smtplib
+import sys
+import time
+from typing import List, Optional
+import aiosmtplib
+import asyncpg
+from app.core.config import settings
+from app.core.email import build_outbox_email
+from app.core.email_dispatcher import email_dispatcher
+from app.core.email_templates import load_email_templates
+from app.core.smtp_pool import smtp_pool
+from app.models.email_outbox import EmailOutbox, OUTBOX_CHANNEL
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Sent rows older than MAILER_RETENTION_DAYS are deleted this often
+PURGE_INTERVAL = 3600
+# Longest wait between attempts to reconnect to the database
+MAX_RECONNECT_DELAY = 60
+
+
+def retry_delay(attempts: int) -> float:
+    """Backoff after the given number of failed attempts: 30s, 1m, 2m, ... capped at 1h."""
+    return min(30 * 2 ** (attempts - 1), 3600)
+
+
+def is_permanent(error: Exception) -> bool:
+    """Every recipient was rejected with a 5xx reply; retrying won't help."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+    elif isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        codes = [refused.code for refused in error.recipients]
+    else:
+        return False
+    return all(code >= 500 for code in codes)
+
+
+class Mailer:
+    def __init__(self, conn: asyncpg.Connection, batch_size: int, dsn: Optional[str] = None):
+        self.conn = conn
+        self.dsn = dsn or settings.DATABASE_URL
+        self.batch_size = batch_size
+        self.sent = 0
+        self.failed = 0
+        self.given_up = 0
+        self._wake = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._last_purge = 0.0
+
+    def _notified(self, *args) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        self._wake.set()
+
+    async def _send(self, row: asyncpg.Record) -> None:
+        msg = build_outbox_email(row['kind'], row['recipient'], json.loads(row['payload']))
+        await email_dispatcher.send(msg)
+
+    async def process_batch(self) -> int:
+        """Claim, send and record one batch; returns the number of rows claimed."""
+        rows = await EmailOutbox.claim(self.conn, self.batch_size, settings.MAILER_LEASE_SECONDS)
+        if not rows:
+            return 0
+        results = await asyncio.gather(*(self._send(row) for row in rows), return_exceptions=True)
+        sent_ids = [row['id'] for row, result in zip(rows, results) if not isinstance(result, Exception)]
+        # Record deliveries first: if recording a failure errors out, the
+        # delivered emails must not be resent when the lease runs out
+        await EmailOutbox.mark_sent(self.conn, sent_ids)
+        self.sent += len(sent_ids)
+        for row, result in zip(rows, results):
+            if not isinstance(result, Exception):
+                continue
+            give_up = row['attempts'] >= settings.MAILER_MAX_ATTEMPTS or is_permanent(result)
+            await EmailOutbox.mark_failed(
+                self.conn, row['id'], str(result), give_up, retry_delay(row['attempts'])
+            )
+            self.failed += 1
+            if give_up:
+                self.given_up += 1
+                logger.error(f"Giving up on {row['kind']} email {row['id']} to {row['recipient']}: {str(result)}")
+        logger.info(f"Sent {len(sent_ids)} of {len(rows)} emails ({self.sent} sent, {self.failed} failed so far)")
+        return len(rows)
+
+    async def _purge(self) -> None:
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        deleted = await EmailOutbox.delete_sent(self.conn, settings.MAILER_RETENTION_DAYS)
+        if deleted:
+            logger.info(f"Deleted {deleted} sent emails from the outbox")
+
+    async def _reconnect(self) -> None:
+        """Open a new connection and LISTEN again, retrying with backoff until it works or the mailer stops."""
+        attempt = 0
+        while not self._stopping.is_set():
+            try:
+                conn = await asyncpg.connect(self.dsn)
+            except (OSError, asyncpg.PostgresError, asyncio.TimeoutError) as e:
+                delay = min(2 ** attempt, MAX_RECONNECT_DELAY)
+                attempt += 1
+                logger.error(f"Mailer could not reconnect to the database, retrying in {delay}s: {str(e)}")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.conn = conn
+            await self.conn.add_listener(OUTBOX_CHANNEL, self._notified)
+            logger.info("Mailer reconnected to the database")
+            return
+
+    async def run(self, once: bool = False) -> None:
+        await self.conn.add_listener(OUTBOX_CHANNEL, self._notified)
+        try:
+            while not self._stopping.is_set():
+                self._wake.clear()
+                try:
+                    claimed = await self.process_batch()
+                    await self._purge()
+                except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                    logger.error(f"Mailer batch failed: {str(e)}")
+                    claimed = 0
+                    if self.conn.is_closed():
+                        await self._reconnect()
+                        continue
+                if claimed == self.batch_size:
+                    continue
+                if once:
+                    return
+                try:
+                    await asyncio.wait_for(self._wake.wait(), settings.MAILER_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if not self.conn.is_closed():
+                await self.conn.remove_listener(OUTBOX_CHANNEL, self._notified)
+
+
+async def run_mailer(batch_size: int, once: bool) -> Mailer:
+    load_email_templates()
+    conn = await asyncpg.connect(settings.DATABASE_URL)
+    mailer = Mailer(conn, batch_size)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, mailer.stop)
+    smtp_pool.start()
+    try:
+        logger.info(f"Mailer started, batches of {batch_size}")
+        await mailer.run(once=once)
+    finally:
+        await email_dispatcher.close()
+        await smtp_pool.stop()
+        await mailer.conn.close()
+    return mailer
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Send the emails queued in the outbox.")
+    parser.add_argument("--batch-size", type=int, default=settings.MAILER_BATCH_SIZE, help="Rows claimed per batch")
+    parser.add_argument("--once", action="store_true", help="Exit once the outbox has no due emails")
+    args = parser.parse_args(argv)
+
+    mailer = asyncio.run(run_mailer(args.batch_size, args.once))
+    logger.info(f"Mailer stopped: {mailer.sent} sent, {mailer.failed} failed, {mailer.given_up} given up")
+    logger.info(f"SMTP batches: {email_dispatcher.stats()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""
+Micro-benchmark: rendering the verification email body for 10k recipients.
+
+Compares a fresh Jinja environment per message (what fastapi-mail does per
+send), a full render from the shared environment, and the pre-rendered
+template that only substitutes the per-recipient URL.
+
+    python -m tests.benchmark_email_render
+"""
+import logging
+import time
+import uuid
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from app.core.config import settings
+from app.core.email_templates import TEMPLATE_DIR, get_email_template, template_env
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MESSAGES = 10_000
+TEMPLATE = 'verification.html'
+
+
+def context(url: str) -> dict:
+    return {'verification_url': url, 'version': settings.VERSION}
+
+
+def render_fresh_environment(url: str) -> str:
+    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape(['html']))
+    return env.get_template(TEMPLATE).render(**context(url))
+
+
+def render_shared_environment(url: str) -> str:
+    return template_env.get_template(TEMPLATE).render(**context(url))
+
+
+def render_precompiled(url: str) -> str:
+    return get_email_template(TEMPLATE).render(verification_url=url)
+
+
+def run_benchmark():
+    urls = [f"{settings.FRONTEND_URL}/verify-email/{uuid.uuid4().hex}" for _ in range(MESSAGES)]
+    assert render_fresh_environment(urls[0]) == render_shared_environment(urls[0]) == render_precompiled(urls[0])
+    for label, render in (
+        ("fresh environment", render_fresh_environment),
+        ("shared environment", render_shared_environment),
+        ("precompiled", render_precompiled),
+    ):
+        started = time.perf_counter()
+        for url in urls:
+            render(url)
+        seconds = time.perf_counter() - started
+        logger.info(
+            f"{label:>20}: {MESSAGES / seconds:10.0f} messages/s ({seconds * 1e6 / MESSAGES:8.2f} us/message)"
+        )
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,38 @@
+"""
+Micro-benchmark: cost of verifying a bearer token on every request.
+
+Compares a plain `jwt.decode` per request with `decode_access_token`, which
+verifies a token once and then serves its claims from the claims cache.
+
+    python -m tests.benchmark_jwt_cache
+"""
+import logging
+import timeit
+import uuid
+from jose import jwt
+from app.core.config import settings
+from app.core.security import create_access_token, decode_access_token, token_claims_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CALLS = 50_000
+
+
+def decode_uncached(token: str) -> dict:
+    return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+
+def run_benchmark():
+    logging.getLogger("app.core.security").setLevel(logging.WARNING)
+    token = create_access_token(data={"sub": str(uuid.uuid4())})
+    assert decode_uncached(token) == decode_access_token(token)
+    token_claims_cache.clear()
+    for label, decode in (("jwt.decode", decode_uncached), ("decode_access_token", decode_access_token)):
+        seconds = min(timeit.repeat(lambda: decode(token), number=CALLS, repeat=5))
+        logger.info(f"{label:>20}: {seconds * 1e6 / CALLS:8.2f} us/call")
+    logger.info(f"claims cache: {token_claims_cache.stats()}")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark: memory and construction cost of User rows.
+
+Compares the slotted `User.from_record` mapper against the previous
+dict-backed User that was built with fifteen `row['...']` keyword lookups.
+
+    python -m tests.benchmark_user_model
+"""
+import logging
+import timeit
+import tracemalloc
+import uuid
+from datetime import datetime
+from app.models.user import User, USER_COLUMNS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ROWS = 100_000
+
+
+class LegacyUser:
+    """The pre-__slots__ User: one __dict__ per instance."""
+
+    def __init__(self, **kwargs):
+        for name in USER_COLUMNS:
+            setattr(self, name, kwargs.get(name))
+
+
+_COLUMN_INDEX = {name: i for i, name in enumerate(USER_COLUMNS)}
+
+
+class FakeRecord(tuple):
+    """Tuple with asyncpg.Record-style key access."""
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = _COLUMN_INDEX[key]
+        return tuple.__getitem__(self, key)
+
+
+def make_rows(count: int):
+    now = datetime.utcnow()
+    return [
+        FakeRecord((
+            str(uuid.uuid4()), "First", "Last", f"user{i}@example.com", "$2b$12$" + "x" * 53,
+            "user", True, True, None, None, now, now, None, None, "email",
+        ))
+        for i in range(count)
+    ]
+
+
+def build_legacy(rows):
+    return [LegacyUser(**{name: row[name] for name in USER_COLUMNS}) for row in rows]
+
+
+def build_slotted(rows):
+    return [User.from_record(row) for row in rows]
+
+
+def measure_memory(builder, rows) -> int:
+    tracemalloc.start()
+    users = builder(rows)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del users
+    return current
+
+
+def run_benchmark():
+    rows = make_rows(ROWS)
+    for label, builder in (("legacy dict User", build_legacy), ("slotted User.from_record", build_slotted)):
+        seconds = min(timeit.repeat(lambda: builder(rows), number=1, repeat=5))
+        memory = measure_memory(builder, rows)
+        logger.info(
+            f"{label:>26}: {seconds * 1e9 / ROWS:8.1f} ns/row, "
+            f"{memory / ROWS:7.1f} bytes/row ({memory / 1024 / 1024:.1f} MiB for {ROWS} rows)"
+        )
+
+
+if __name__ == "__main__":
+    run_benchmark()
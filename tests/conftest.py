@@ -0,0 +1,9 @@
+import os
+
+# app.core.email validates the mail settings at import time, so they must be
+# set before test modules are collected
+for name, value in (
+    ("SMTP_USER", "user"), ("SMTP_PASSWORD", "secret"), ("SMTP_HOST", "localhost"),
+    ("EMAILS_FROM_EMAIL", "noreply@example.com"),
+):
+    os.environ.setdefault(name, value)
@@ -0,0 +1,140 @@
+import asyncio
+import pytest
+from app.core.config import settings
+from app.db import pool as pool_module
+from app.db import routing
+from app.db.pool import DatabasePool
+from app.db.routing import DatabaseRouter
+
+
+class FakePool:
+    def __init__(self, name, fail=False, available=True):
+        self.name = name
+        self.fail = fail
+        self.is_available = available
+        self.leased = 0
+
+    async def lease(self, timeout=None):
+        if self.fail:
+            raise OSError("connection refused")
+        self.leased += 1
+        return f"{self.name}-conn"
+
+    async def release(self, conn):
+        pass
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(routing.time, "monotonic", clock.monotonic)
+    return clock
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    primary = FakePool("primary")
+    replicas = [FakePool("replica-0"), FakePool("replica-1")]
+    monkeypatch.setattr(routing, "get_pool", lambda name="primary": primary)
+    monkeypatch.setattr(routing, "get_replica_pools", lambda: replicas)
+    return primary, replicas
+
+
+def read_from(router, key=None):
+    conn, pool = asyncio.run(router.lease_read(key))
+    return pool.name
+
+
+def test_reads_rotate_over_replicas(pools):
+    router = DatabaseRouter()
+    assert [read_from(router) for _ in range(4)] == ["replica-0", "replica-1", "replica-0", "replica-1"]
+    assert router.stats()["replica_reads"] == 4
+
+
+def test_writes_pin_reads_to_primary_until_expiry(pools, clock, monkeypatch):
+    monkeypatch.setattr(settings, "READ_YOUR_WRITES_SECONDS", 5.0)
+    router = DatabaseRouter()
+    router.record_write("user-1")
+    assert read_from(router, "user-1") == "primary"
+    assert read_from(router, "user-2").startswith("replica")
+    clock.now += 5.1
+    assert not router.is_pinned("user-1")
+    assert read_from(router, "user-1").startswith("replica")
+
+
+def test_expired_pins_are_dropped(pools, clock, monkeypatch):
+    monkeypatch.setattr(settings, "READ_YOUR_WRITES_SECONDS", 5.0)
+    router = DatabaseRouter()
+    router.record_write("user-1")
+    clock.now += 6
+    router.record_write("user-2")
+    assert router.stats()["active_pins"] == 1
+
+
+def test_pinning_disabled(pools, monkeypatch):
+    monkeypatch.setattr(settings, "READ_YOUR_WRITES_SECONDS", 0)
+    router = DatabaseRouter()
+    router.record_write("user-1")
+    assert read_from(router, "user-1").startswith("replica")
+
+
+def test_failed_replica_falls_back_to_primary(pools):
+    primary, replicas = pools
+    replicas[0].fail = True
+    router = DatabaseRouter()
+    assert read_from(router) == "primary"
+    assert router.stats()["replica_fallbacks"] == 1
+
+
+def test_unavailable_replicas_are_skipped(pools):
+    primary, replicas = pools
+    replicas[0].is_available = False
+    router = DatabaseRouter()
+    assert [read_from(router) for _ in range(3)] == ["replica-1"] * 3
+    replicas[1].is_available = False
+    assert read_from(router) == "primary"
+    assert router.stats()["replica_fallbacks"] == 0
+
+
+def test_pool_reopens_after_backoff(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(pool_module.time, "monotonic", clock.monotonic)
+    attempts = []
+
+    class FakeAsyncpgPool:
+        async def acquire(self, timeout=None):
+            return "conn"
+
+    async def create_pool():
+        attempts.append(clock.now)
+        if len(attempts) < 3:
+            raise OSError("connection refused")
+        return FakeAsyncpgPool()
+
+    replica = DatabasePool("postgresql://replica", name="replica-0")
+    monkeypatch.setattr(replica, "_create_pool", create_pool)
+    monkeypatch.setattr(replica, "_is_healthy", lambda conn: asyncio.sleep(0, True))
+
+    with pytest.raises(OSError):
+        asyncio.run(replica.open())
+    assert not replica.is_available
+    with pytest.raises(RuntimeError):
+        asyncio.run(replica.lease())
+    clock.now += 1
+    with pytest.raises(OSError):
+        asyncio.run(replica.lease())
+    # The second failure doubles the delay
+    clock.now += 1
+    assert not replica.is_available
+    clock.now += 1
+    assert asyncio.run(replica.lease()) == "conn"
+    assert replica.is_open
+    assert len(attempts) == 3
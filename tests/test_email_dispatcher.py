@@ -0,0 +1,58 @@
+import asyncio
+import pytest
+from app.core.email_dispatcher import EmailDispatcher
+from app.core.smtp_pool import AsyncSMTPConnectionPool, SMTPConnectionPool
+from test_smtp_pool import SMTPServer, message
+
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPServer()
+    yield server
+    server.close()
+
+
+async def send_all(dispatcher: EmailDispatcher, recipients) -> list:
+    try:
+        return await asyncio.gather(
+            *(dispatcher.send(message(to)) for to in recipients), return_exceptions=True
+        )
+    finally:
+        await dispatcher.close()
+
+
+def test_messages_are_batched_per_session(smtp_server):
+    pool = SMTPConnectionPool("127.0.0.1", smtp_server.port, use_tls=False, size=2, timeout=5)
+    dispatcher = EmailDispatcher(pool, max_batch=10, flush_interval=0.05)
+    results = asyncio.run(send_all(dispatcher, [f"user{i}@example.com" for i in range(25)]))
+    pool.close()
+    assert results == [None] * 25
+    assert len(smtp_server.messages) == 25
+    stats = dispatcher.stats()
+    # Two full batches and a remainder flushed by the timer
+    assert stats["batches"] == 3
+    assert stats["largest_batch"] == 10
+    assert smtp_server.connections <= 2
+
+
+def test_failures_are_reported_per_message(smtp_server):
+    smtp_server.reject_rcpt.add("nobody@example.com")
+    pool = SMTPConnectionPool("127.0.0.1", smtp_server.port, use_tls=False, size=1, timeout=5)
+    dispatcher = EmailDispatcher(pool, max_batch=5, flush_interval=0.01)
+    results = asyncio.run(send_all(dispatcher, ["a@example.com", "nobody@example.com", "b@example.com"]))
+    pool.close()
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], Exception)
+    assert len(smtp_server.messages) == 2
+    assert smtp_server.connections == 1
+    assert dispatcher.stats()["failed"] == 1
+
+
+def test_async_pool_uses_no_threads(smtp_server):
+    pool = AsyncSMTPConnectionPool("127.0.0.1", smtp_server.port, use_tls=False, size=2, timeout=5)
+    dispatcher = EmailDispatcher(pool, max_batch=10, flush_interval=0.05)
+    results = asyncio.run(send_all(dispatcher, [f"user{i}@example.com" for i in range(25)]))
+    assert results == [None] * 25
+    assert len(smtp_server.messages) == 25
+    assert dispatcher.stats()["batches"] == 3
+    assert dispatcher._executor is None
@@ -0,0 +1,43 @@
+import pytest
+from app.core.config import settings
+from app.core.email import LOGO_PATH, create_password_reset_email, create_verification_email, get_logo_part
+from app.core.email_templates import get_email_template
+
+
+def html_part(msg) -> str:
+    return msg.get_payload()[0].get_payload(decode=True).decode()
+
+
+def test_logo_part_is_encoded_once_and_shared():
+    first = create_verification_email("a@example.com", "token-a")
+    second = create_password_reset_email("b@example.com", "token-b")
+    assert first.get_payload()[1] is second.get_payload()[1] is get_logo_part()
+    assert first.get_content_type() == "multipart/related"
+    assert 'src="cid:logo"' in html_part(first)
+    with pytest.raises(TypeError):
+        get_logo_part()["Content-ID"] = "<other>"
+
+
+def test_sender_is_not_the_recipient():
+    msg = create_verification_email("a@example.com", "token-a")
+    assert msg["To"] == "a@example.com"
+    assert (settings.EMAILS_FROM_EMAIL or settings.SMTP_USER) in msg["From"]
+    assert msg["From"] != msg["To"]
+
+
+def test_hosted_logo_shrinks_messages(monkeypatch):
+    inline_size = len(create_verification_email("a@example.com", "token-a").as_bytes())
+    monkeypatch.setattr(settings, "EMAIL_LOGO_URL", "https://cdn.example.com/logo.png")
+    get_email_template.cache_clear()
+    try:
+        hosted = create_verification_email("a@example.com", "token-a")
+    finally:
+        get_email_template.cache_clear()
+    hosted_size = len(hosted.as_bytes())
+    print(
+        f"\nverification email: {inline_size} bytes with the embedded logo "
+        f"({LOGO_PATH.stat().st_size} byte PNG), {hosted_size} bytes with a hosted logo"
+    )
+    assert len(hosted.get_payload()) == 1
+    assert 'src="https://cdn.example.com/logo.png"' in html_part(hosted)
+    assert hosted_size * 10 < inline_size
@@ -0,0 +1,40 @@
+import pytest
+from jinja2 import Environment, DictLoader
+from app.core.config import settings
+from app.core.email_templates import (
+    EMAIL_TEMPLATES, PrecompiledTemplate, fastapi_mail_env, get_email_template, template_env,
+)
+
+
+def test_precompiled_matches_full_render():
+    for name, variables in EMAIL_TEMPLATES.items():
+        values = {variable: f"https://example.com/{variable}?a=1&b=<2>" for variable in variables}
+        expected = template_env.get_template(name).render(
+            version=settings.VERSION,
+            reset_expire_minutes=settings.PASSWORD_RESET_TOKEN_EXPIRE_MINUTES,
+            **values,
+        )
+        assert get_email_template(name).render(**values) == expected
+
+
+def test_values_are_escaped():
+    html = get_email_template('verification.html').render(verification_url='"><script>x</script>')
+    assert "<script>" not in html
+    assert "&#34;&gt;&lt;script&gt;" in html
+
+
+def test_missing_variable_is_rejected():
+    with pytest.raises(ValueError, match="verification_url"):
+        get_email_template('verification.html').render()
+
+
+def test_static_context_is_rendered_once():
+    env = Environment(loader=DictLoader({"t.html": "{{ greeting }}, {{ name }}! {{ name }}"}), autoescape=True)
+    template = PrecompiledTemplate(env.get_template("t.html"), {"greeting": "Hi"}, ("name",))
+    assert template.render(name="Ann & Bo") == "Hi, Ann &amp; Bo! Ann &amp; Bo"
+
+
+def test_fastapi_mail_templates_are_not_autoescaped():
+    html = fastapi_mail_env.get_template('email.html').render(subject="Q&A <news>", body="<p>Hi</p>")
+    assert "<title>Q&A <news></title>" in html
+    assert "<p>Hi</p>" in html
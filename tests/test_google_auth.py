@@ -0,0 +1,146 @@
+import asyncio
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt
+from google.auth import jwt as google_jwt
+from app.core.google import GoogleTokenVerifier
+
+CLIENT_ID = "test-client.apps.googleusercontent.com"
+
+
+def make_signing_cert(kid: str):
+    """Return (signer, PEM certificate) for a fresh RSA key."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, kid)])
+    now = datetime.datetime.utcnow()
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    signer = crypt.RSASigner.from_string(private_pem, key_id=kid)
+    return signer, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def id_token(signer, **overrides) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": "https://accounts.google.com",
+        "aud": CLIENT_ID,
+        "sub": "1234567890",
+        "email": "someone@example.com",
+        "iat": now,
+        "exp": now + 3600,
+    }
+    claims.update(overrides)
+    return google_jwt.encode(signer, claims).decode()
+
+
+class CertServer:
+    """Stand-in for Google's certificate endpoint."""
+
+    def __init__(self, certs: dict, max_age: int = 3600):
+        self.certs = certs
+        self.max_age = max_age
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                body = json.dumps(server.certs).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Cache-Control", f"public, max-age={server.max_age}, must-revalidate")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/oauth2/v1/certs"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def signing_key():
+    return make_signing_cert("key-1")
+
+
+@pytest.fixture
+def cert_server(signing_key):
+    server = CertServer({"key-1": signing_key[1]})
+    yield server
+    server.close()
+
+
+async def verify_many(verifier: GoogleTokenVerifier, tokens) -> list:
+    try:
+        return await asyncio.gather(*(verifier.verify(token) for token in tokens), return_exceptions=True)
+    finally:
+        await verifier.close()
+
+
+def test_certs_are_fetched_once_and_cached(cert_server, signing_key):
+    verifier = GoogleTokenVerifier(cert_server.url, CLIENT_ID)
+    tokens = [id_token(signing_key[0], sub=str(i)) for i in range(20)]
+    results = asyncio.run(verify_many(verifier, tokens))
+    assert [claims["sub"] for claims in results] == [str(i) for i in range(20)]
+    assert cert_server.requests == 1
+    assert verifier.stats()["certs_expire_in"] > 3500
+
+
+def test_invalid_tokens_are_rejected(cert_server, signing_key):
+    verifier = GoogleTokenVerifier(cert_server.url, CLIENT_ID)
+    other_signer, _ = make_signing_cert("key-1")
+    results = asyncio.run(verify_many(verifier, [
+        id_token(signing_key[0], aud="someone-else"),
+        id_token(signing_key[0], iss="https://evil.example.com"),
+        id_token(signing_key[0], exp=int(time.time()) - 3600, iat=int(time.time()) - 7200),
+        id_token(other_signer),
+        "not-a-token",
+    ]))
+    assert all(isinstance(result, ValueError) for result in results)
+    assert verifier.stats()["failures"] == 5
+
+
+def test_unknown_kid_refreshes_certs(cert_server, signing_key):
+    verifier = GoogleTokenVerifier(cert_server.url, CLIENT_ID)
+    rotated_signer, rotated_cert = make_signing_cert("key-2")
+
+    async def scenario():
+        await verifier.verify(id_token(signing_key[0]))
+        cert_server.certs["key-2"] = rotated_cert
+        verifier.MIN_REFRESH_INTERVAL = 0  # as if the certs were fetched a while ago
+        claims = await verifier.verify(id_token(rotated_signer))
+        verifier.MIN_REFRESH_INTERVAL = GoogleTokenVerifier.MIN_REFRESH_INTERVAL
+        # A junk kid right after a refresh is rejected without another fetch
+        with pytest.raises(ValueError):
+            await verifier.verify(id_token(make_signing_cert("key-3")[0]))
+        await verifier.close()
+        return claims
+
+    assert asyncio.run(scenario())["email"] == "someone@example.com"
+    assert cert_server.requests == 2
@@ -0,0 +1,20 @@
+from app.tools.import_users import read_rows
+
+
+def test_jsonl_rows_that_are_not_objects_are_row_errors(tmp_path):
+    path = tmp_path / "users.jsonl"
+    path.write_text(
+        '{"email": "a@example.com"}\n'
+        '5\n'
+        '\n'
+        'null\n'
+        '["b@example.com"]\n'
+        '{"email": \n'
+    )
+    rows = list(read_rows(str(path), "jsonl"))
+    assert rows[0] == (1, {"email": "a@example.com"})
+    assert [line for line, _ in rows] == [1, 2, 4, 5, 6]
+    assert rows[1][1] == {"__error__": "Expected a JSON object, got int"}
+    assert rows[2][1] == {"__error__": "Expected a JSON object, got NoneType"}
+    assert rows[3][1] == {"__error__": "Expected a JSON object, got list"}
+    assert rows[4][1]["__error__"].startswith("Invalid JSON")
@@ -0,0 +1,25 @@
+from datetime import timedelta
+import pytest
+from jose import JWTError
+from app.core.security import create_access_token, decode_access_token, token_claims_cache
+
+
+def test_cached_claims_match_and_are_copies():
+    token = create_access_token(data={"sub": "user-1"})
+    first = decode_access_token(token)
+    first["sub"] = "someone-else"
+    hits = token_claims_cache.hits
+    assert decode_access_token(token)["sub"] == "user-1"
+    assert token_claims_cache.hits == hits + 1
+
+
+def test_tampered_and_expired_tokens_are_rejected():
+    token = create_access_token(data={"sub": "user-2"})
+    decode_access_token(token)
+    header, payload, signature = token.split(".")
+    forged = ".".join((header, payload, signature[::-1]))
+    with pytest.raises(JWTError):
+        decode_access_token(forged)
+    expired = create_access_token(data={"sub": "user-2"}, expires_delta=timedelta(seconds=-5))
+    with pytest.raises(JWTError):
+        decode_access_token(expired)
@@ -0,0 +1,57 @@
+import json
+import pytest
+from cryptography.hazmat.primitives import serialization
+from jose import JWTError, jwt
+from app.core.jwt_keys import KeyRing
+from app.tools.generate_jwt_key import main as generate_jwt_key
+
+
+def sign(key_ring: KeyRing, claims: dict) -> str:
+    key = key_ring.signing_key()
+    return jwt.encode(claims, key.private_key, algorithm=key.algorithm, headers={"kid": key.kid})
+
+
+def published_keys(key_ring: KeyRing) -> list:
+    return json.loads(key_ring.jwks_body)["keys"]
+
+
+def verify(key_ring: KeyRing, token: str) -> dict:
+    kid = jwt.get_unverified_header(token).get("kid")
+    return jwt.decode(token, key_ring.verification_key(kid), algorithms=[key_ring.algorithm])
+
+
+@pytest.mark.parametrize("algorithm", ["RS256", "ES256"])
+def test_rotation_keeps_retired_keys_verifiable(tmp_path, algorithm):
+    assert generate_jwt_key(["--algorithm", algorithm, "--kid", "2024-01", "--dir", str(tmp_path)]) == 0
+    old_ring = KeyRing.from_directory(str(tmp_path), algorithm)
+    old_token = sign(old_ring, {"sub": "user-1"})
+
+    # Rotate: publish a newer key while the old one keeps signing
+    assert generate_jwt_key(["--algorithm", algorithm, "--kid", "2024-06", "--dir", str(tmp_path)]) == 0
+    with pytest.raises(RuntimeError):
+        KeyRing.from_directory(str(tmp_path), algorithm)
+    publishing = KeyRing.from_directory(str(tmp_path), algorithm, active_kid="2024-01")
+    assert publishing.active_kid == "2024-01"
+    assert sorted(key["kid"] for key in published_keys(publishing)) == ["2024-01", "2024-06"]
+
+    # Switch to the new key and keep only the public half of the old one
+    old_pem = tmp_path / "2024-01.pem"
+    private = serialization.load_pem_private_key(old_pem.read_bytes(), None)
+    old_pem.write_bytes(private.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ))
+    ring = KeyRing.from_directory(str(tmp_path), algorithm, active_kid="2024-06")
+
+    assert ring.active_kid == "2024-06"
+    assert sorted(key["kid"] for key in published_keys(ring)) == ["2024-01", "2024-06"]
+    assert verify(ring, old_token)["sub"] == "user-1"
+    assert verify(ring, sign(ring, {"sub": "user-2"}))["sub"] == "user-2"
+    assert ring.jwks_etag != old_ring.jwks_etag
+
+
+def test_unknown_kid_is_rejected(tmp_path):
+    generate_jwt_key(["--algorithm", "ES256", "--kid", "a", "--dir", str(tmp_path / "a")])
+    generate_jwt_key(["--algorithm", "ES256", "--kid", "b", "--dir", str(tmp_path / "b")])
+    token = sign(KeyRing.from_directory(str(tmp_path / "b"), "ES256"), {"sub": "user-1"})
+    with pytest.raises(JWTError):
+        verify(KeyRing.from_directory(str(tmp_path / "a"), "ES256"), token)
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import smtplib
+import aiosmtplib
+import asyncpg
+import pytest
+from app.core.config import settings
+from app.core.email import PASSWORD_RESET_EMAIL, VERIFICATION_EMAIL
+from app.core.email_dispatcher import EmailDispatcher
+from app.db.statements import statements
+from app.models.email_outbox import CLAIM, DELETE_SENT, MARK_FAILED, MARK_SENT, OUTBOX_CHANNEL
+from app.workers import mailer as mailer_module
+from app.workers.mailer import Mailer, is_permanent, retry_delay
+
+
+class FakeConnection:
+    """The email_outbox table in memory, answering the registered statements."""
+
+    def __init__(self, broken=False):
+        self.rows = []
+        self.calls = []
+        self.listeners = []
+        self.listened = []
+        self.broken = broken
+
+    def insert(self, recipient, kind=VERIFICATION_EMAIL, attempts=0):
+        self.rows.append({
+            'id': len(self.rows) + 1,
+            'kind': kind,
+            'recipient': recipient,
+            'payload': json.dumps({'token': f"token-{recipient}"}),
+            'attempts': attempts,
+            'status': 'pending',
+            'retry_in': None,
+        })
+
+    def row(self, recipient):
+        return next(row for row in self.rows if row['recipient'] == recipient)
+
+    def is_closed(self):
+        return self.broken
+
+    async def add_listener(self, channel, callback):
+        self.listeners.append(channel)
+        self.listened.append(channel)
+
+    async def remove_listener(self, channel, callback):
+        self.listeners.remove(channel)
+
+    async def fetch(self, sql, *args):
+        if self.broken:
+            raise asyncpg.InterfaceError("connection is closed")
+        assert sql == statements.sql(CLAIM)
+        limit, _ = args
+        claimed = [row for row in self.rows if row['status'] == 'pending' and row['retry_in'] is None][:limit]
+        for row in claimed:
+            row['attempts'] += 1
+        self.calls.append(('claim', [row['id'] for row in claimed]))
+        return [dict(row) for row in claimed]
+
+    async def execute(self, sql, *args):
+        if sql == statements.sql(MARK_SENT):
+            ids, = args
+            for row in self.rows:
+                if row['id'] in ids:
+                    row['status'] = 'sent'
+            self.calls.append(('mark_sent', ids))
+            return f"UPDATE {len(ids)}"
+        if sql == statements.sql(MARK_FAILED):
+            id, error, give_up, retry_in = args
+            row = next(row for row in self.rows if row['id'] == id)
+            row['status'] = 'failed' if give_up else 'pending'
+            row['retry_in'] = retry_in
+            self.calls.append(('mark_failed', id))
+            return "UPDATE 1"
+        assert sql == statements.sql(DELETE_SENT)
+        return "DELETE 0"
+
+
+class FakeSMTPPool:
+    """Stands in for SMTPConnectionPool: rejects or fails the listed recipients."""
+
+    size = 1
+
+    def __init__(self):
+        self.sent = []
+        self.reject = set()
+        self.fail = set()
+
+    def send_many(self, messages):
+        results = []
+        for msg in messages:
+            to = msg["To"]
+            if to in self.reject:
+                results.append(smtplib.SMTPRecipientsRefused({to: (550, b"No such user")}))
+            elif to in self.fail:
+                results.append(smtplib.SMTPResponseException(451, b"Try again later"))
+            else:
+                self.sent.append(to)
+                results.append(None)
+        return results
+
+
+@pytest.fixture
+def smtp_pool(monkeypatch):
+    pool = FakeSMTPPool()
+    dispatcher = EmailDispatcher(pool, max_batch=10, flush_interval=0.01)
+    monkeypatch.setattr(mailer_module, "email_dispatcher", dispatcher)
+    return pool
+
+
+async def process(mailer: Mailer) -> int:
+    try:
+        return await mailer.process_batch()
+    finally:
+        await mailer_module.email_dispatcher.close()
+
+
+def test_retry_delay_grows_and_is_capped():
+    delays = [retry_delay(attempts) for attempts in range(1, 10)]
+    assert delays[:4] == [30, 60, 120, 240]
+    assert delays == sorted(delays)
+    assert delays[-1] == 3600
+
+
+def test_only_rejections_of_every_recipient_are_permanent():
+    assert is_permanent(smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"No such user")}))
+    assert not is_permanent(smtplib.SMTPRecipientsRefused({
+        "a@example.com": (550, b"No such user"),
+        "b@example.com": (452, b"Mailbox full"),
+    }))
+    assert is_permanent(aiosmtplib.SMTPRecipientsRefused([
+        aiosmtplib.SMTPRecipientRefused(550, "No such user", "a@example.com"),
+    ]))
+    assert not is_permanent(aiosmtplib.SMTPRecipientsRefused([
+        aiosmtplib.SMTPRecipientRefused(450, "Greylisted", "a@example.com"),
+    ]))
+    assert not is_permanent(smtplib.SMTPServerDisconnected("Connection lost"))
+
+
+def test_batch_is_split_into_sent_and_failed(smtp_pool):
+    conn = FakeConnection()
+    for recipient in ["a@example.com", "busy@example.com", "b@example.com"]:
+        conn.insert(recipient, kind=PASSWORD_RESET_EMAIL)
+    smtp_pool.fail.add("busy@example.com")
+    mailer = Mailer(conn, batch_size=10, dsn="unused")
+    assert asyncio.run(process(mailer)) == 3
+    assert smtp_pool.sent == ["a@example.com", "b@example.com"]
+    # Deliveries are recorded before any failure
+    assert conn.calls == [('claim', [1, 2, 3]), ('mark_sent', [1, 3]), ('mark_failed', 2)]
+    busy = conn.row("busy@example.com")
+    assert busy['status'] == 'pending'
+    assert busy['retry_in'] == retry_delay(1)
+    assert (mailer.sent, mailer.failed, mailer.given_up) == (2, 1, 0)
+
+
+def test_retries_back_off_with_attempts(smtp_pool):
+    conn = FakeConnection()
+    conn.insert("busy@example.com", attempts=2)
+    smtp_pool.fail.add("busy@example.com")
+    mailer = Mailer(conn, batch_size=10, dsn="unused")
+    asyncio.run(process(mailer))
+    row = conn.row("busy@example.com")
+    assert row['status'] == 'pending'
+    assert row['retry_in'] == retry_delay(3) > retry_delay(1)
+
+
+def test_permanent_failures_are_given_up(smtp_pool):
+    conn = FakeConnection()
+    conn.insert("nobody@example.com")
+    conn.insert("busy@example.com", attempts=settings.MAILER_MAX_ATTEMPTS - 1)
+    smtp_pool.reject.add("nobody@example.com")
+    smtp_pool.fail.add("busy@example.com")
+    mailer = Mailer(conn, batch_size=10, dsn="unused")
+    asyncio.run(process(mailer))
+    assert conn.row("nobody@example.com")['status'] == 'failed'
+    assert conn.row("busy@example.com")['status'] == 'failed'
+    # Nothing was delivered, so there is nothing to mark sent
+    assert conn.calls == [('claim', [1, 2]), ('mark_failed', 1), ('mark_failed', 2)]
+    assert (mailer.sent, mailer.failed, mailer.given_up) == (0, 2, 2)
+
+
+def test_broken_connection_is_replaced(smtp_pool, monkeypatch):
+    broken = FakeConnection(broken=True)
+    fresh = FakeConnection()
+    fresh.insert("a@example.com")
+    dsns = []
+
+    async def connect(dsn):
+        dsns.append(dsn)
+        return fresh
+
+    monkeypatch.setattr(mailer_module.asyncpg, "connect", connect)
+    mailer = Mailer(broken, batch_size=10, dsn="postgresql://mailer@db/app")
+
+    async def run():
+        try:
+            await mailer.run(once=True)
+        finally:
+            await mailer_module.email_dispatcher.close()
+
+    asyncio.run(run())
+    assert dsns == ["postgresql://mailer@db/app"]
+    assert mailer.conn is fresh
+    assert fresh.listened == [OUTBOX_CHANNEL]
+    assert smtp_pool.sent == ["a@example.com"]
+    assert fresh.row("a@example.com")['status'] == 'sent'
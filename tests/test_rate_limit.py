@@ -0,0 +1,95 @@
+import asyncio
+import time
+import pytest
+from app.core.rate_limit import Limit, MemoryBackend, RateLimiter, RateLimitExceeded, RedisBackend
+
+
+class FakeRedis:
+    """Local stand-in for the subset of redis.asyncio.Redis the backend uses."""
+
+    def __init__(self):
+        self.values = {}
+        self.expiry = {}
+
+    def _live(self, key):
+        if key in self.expiry and self.expiry[key] <= time.monotonic():
+            self.values.pop(key, None)
+            self.expiry.pop(key, None)
+        return self.values.get(key)
+
+    async def mget(self, keys):
+        return [None if self._live(key) is None else str(self._live(key)).encode() for key in keys]
+
+    async def incr(self, key):
+        self.values[key] = (self._live(key) or 0) + 1
+        return self.values[key]
+
+    async def expire(self, key, seconds):
+        self.expiry[key] = time.monotonic() + seconds
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+        self.expiry.pop(key, None)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def limiter(request):
+    backend = MemoryBackend() if request.param == "memory" else RedisBackend(FakeRedis())
+    return RateLimiter(backend)
+
+
+def attempt(limiter, limits, now):
+    asyncio.run(limiter.hit(limits, now=now))
+
+
+def test_limit_is_enforced_per_key(limiter):
+    start = 1_000_020.0  # 20s into a 60s window
+    ip, email = Limit("ip", "10.0.0.1", 5, 60), Limit("email", "a@example.com", 3, 60)
+    for _ in range(3):
+        attempt(limiter, [ip, email], start)
+    with pytest.raises(RateLimitExceeded) as exc:
+        attempt(limiter, [ip, email], start)
+    assert exc.value.name == "email"
+    assert 0 < exc.value.retry_after <= 60
+    # Rejected attempts are not counted, so the IP still has room for other emails
+    attempt(limiter, [ip, Limit("email", "b@example.com", 3, 60)], start)
+    attempt(limiter, [ip, Limit("email", "c@example.com", 3, 60)], start)
+    with pytest.raises(RateLimitExceeded) as exc:
+        attempt(limiter, [ip, Limit("email", "d@example.com", 3, 60)], start)
+    assert exc.value.name == "ip"
+    assert limiter.stats()["throttled"] == {"email": 1, "ip": 1}
+
+
+def test_window_slides(limiter):
+    limit = Limit("email", "a@example.com", 4, 60)
+    start = 1_000_050.0  # windows start at multiples of 60: 1_000_020, 1_000_080, ...
+    for _ in range(4):
+        attempt(limiter, [limit], start)
+    with pytest.raises(RateLimitExceeded) as exc:
+        attempt(limiter, [limit], start)
+    assert exc.value.retry_after == 30
+    # After the rollover the previous window's attempts still count, weighted
+    # by how much of it is inside the sliding window: one attempt now fits
+    attempt(limiter, [limit], 1_000_081.0)
+    with pytest.raises(RateLimitExceeded) as exc:
+        attempt(limiter, [limit], 1_000_081.0)
+    # Retry-After is when the weighted count has decayed below the limit
+    attempt(limiter, [limit], 1_000_081.0 + exc.value.retry_after)
+
+
+def test_reset_clears_key(limiter):
+    limit = Limit("email", "a@example.com", 2, 60)
+    for _ in range(2):
+        attempt(limiter, [limit], 1_000_020.0)
+    asyncio.run(limiter.reset(limit, now=1_000_020.0))
+    attempt(limiter, [limit], 1_000_020.0)
+
+
+def test_backend_errors_fail_open():
+    class BrokenBackend:
+        async def get_many(self, keys):
+            raise ConnectionError("down")
+
+    limiter = RateLimiter(BrokenBackend())
+    attempt(limiter, [Limit("ip", "x", 1, 60)], 1_000_000.0)
+    assert limiter.stats()["backend_errors"] == 1
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.core import revocation
+from app.core.revocation import RevocationList
+from app.db.statements import statements
+from app.models.revoked_token import DELETE_EXPIRED, GET_ACTIVE, GET_REVOKED_SINCE, REVOKE_TOKEN
+
+
+class FakeConnection:
+    """The revoked_tokens table in memory, answering the registered statements."""
+
+    def __init__(self):
+        self.rows = []
+        self.queries = []
+
+    def insert(self, jti, expires_in, revoked_at=None):
+        self.rows.append({
+            'jti': jti,
+            'expires_at': datetime.now(timezone.utc) + timedelta(seconds=expires_in),
+            'revoked_at': revoked_at or datetime.now(timezone.utc),
+        })
+
+    async def fetch(self, sql, *args):
+        now = datetime.now(timezone.utc)
+        self.queries.append((sql, args))
+        rows = [row for row in self.rows if row['expires_at'] > now]
+        if sql == statements.sql(GET_REVOKED_SINCE):
+            rows = [row for row in rows if row['revoked_at'] >= args[0]]
+        else:
+            assert sql == statements.sql(GET_ACTIVE)
+        return rows
+
+    async def execute(self, sql, *args):
+        if sql == statements.sql(REVOKE_TOKEN):
+            jti, user_id, expires_at = args
+            self.rows.append({'jti': jti, 'expires_at': expires_at, 'revoked_at': datetime.now(timezone.utc)})
+            return "INSERT 0 1"
+        assert sql == statements.sql(DELETE_EXPIRED)
+        now = datetime.now(timezone.utc)
+        kept = [row for row in self.rows if row['expires_at'] > now]
+        deleted = len(self.rows) - len(kept)
+        self.rows = kept
+        return f"DELETE {deleted}"
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = FakeConnection()
+    monkeypatch.setattr(revocation, "get_pool", lambda name="primary": FakePool(conn))
+    return conn
+
+
+def test_revoked_until_expiry():
+    revocations = RevocationList()
+    revocations.add("a", time.time() + 60)
+    revocations.add("b", time.time() - 1)
+    assert revocations.is_revoked("a")
+    assert not revocations.is_revoked("b")
+    assert not revocations.is_revoked("c")
+    assert not revocations.is_revoked(None)
+    assert revocations.stats()["rejected_requests"] == 1
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    revocations = RevocationList()
+    now = time.time()
+    revocations.add("a", now + 60)
+    monkeypatch.setattr(revocation.time, "time", lambda: now + 120)
+    assert not revocations.is_revoked("a")
+    assert revocations.stats()["revoked_tokens"] == 0
+
+
+def test_revoke_persists_and_applies_at_once(conn):
+    revocations = RevocationList()
+    asyncio.run(revocations.revoke(conn, "a", "user-1", time.time() + 60))
+    assert revocations.is_revoked("a")
+    assert [row['jti'] for row in conn.rows] == ["a"]
+
+
+def test_first_refresh_loads_everything_unexpired(conn):
+    conn.insert("a", 60)
+    conn.insert("old", -60)
+    revocations = RevocationList()
+    asyncio.run(revocations.refresh())
+    assert revocations.is_revoked("a")
+    assert not revocations.is_revoked("old")
+    assert conn.queries[0] == (statements.sql(GET_ACTIVE), ())
+
+
+def test_refresh_reads_from_high_water_mark_with_overlap(conn):
+    newest = datetime.now(timezone.utc) - timedelta(minutes=5)
+    conn.insert("a", 60, revoked_at=newest - timedelta(minutes=1))
+    conn.insert("b", 60, revoked_at=newest)
+    revocations = RevocationList()
+    asyncio.run(revocations.refresh())
+    # A revocation stamped earlier than the newest one but committed later
+    conn.insert("late", 60, revoked_at=newest - timedelta(seconds=10))
+    conn.insert("too-late", 60, revoked_at=newest - timedelta(minutes=2))
+    asyncio.run(revocations.refresh())
+    sql, args = conn.queries[-1]
+    assert sql == statements.sql(GET_REVOKED_SINCE)
+    assert args == (newest - RevocationList.REFRESH_OVERLAP,)
+    assert revocations.is_revoked("late")
+    assert not revocations.is_revoked("too-late")
+
+
+def test_refresh_purges_expired_rows_once_per_interval(conn):
+    conn.insert("a", 60)
+    conn.insert("old", -60)
+    revocations = RevocationList()
+    asyncio.run(revocations.refresh())
+    assert [row['jti'] for row in conn.rows] == ["a"]
+    conn.insert("old-2", -60)
+    asyncio.run(revocations.refresh())
+    assert len(conn.rows) == 2
@@ -0,0 +1,233 @@
+import asyncio
+import smtplib
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+import aiosmtplib
+import pytest
+from app.core.smtp_pool import AsyncSMTPConnectionPool, SMTPConnectionPool
+
+
+class SMTPServer:
+    """Minimal SMTP server that records sessions, logins, NOOPs and messages."""
+
+    def __init__(self):
+        self.connections = 0
+        self.logins = 0
+        self.noops = 0
+        self.messages = []
+        self.reject_rcpt = set()
+        self.data_delay = 0.0
+        self.handlers = []
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode() + b"\r\n")
+
+            def handle(self):
+                server.connections += 1
+                server.handlers.append(self)
+                self.reply("220 test ready")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode().strip()
+                    verb = command.split(" ", 1)[0].upper()
+                    if verb == "EHLO":
+                        self.reply("250-test")
+                        self.reply("250 AUTH PLAIN LOGIN")
+                    elif verb == "AUTH":
+                        server.logins += 1
+                        self.reply("235 ok")
+                    elif verb == "NOOP":
+                        server.noops += 1
+                        self.reply("250 ok")
+                    elif verb == "RCPT" and any(r in command for r in server.reject_rcpt):
+                        self.reply("550 no such user")
+                    elif verb in ("MAIL", "RCPT", "RSET"):
+                        self.reply("250 ok")
+                    elif verb == "DATA":
+                        self.reply("354 go ahead")
+                        data = []
+                        while (line := self.rfile.readline()) not in (b".\r\n", b""):
+                            data.append(line)
+                        time.sleep(server.data_delay)
+                        server.messages.append(b"".join(data))
+                        self.reply("250 queued")
+                    elif verb == "QUIT":
+                        self.reply("221 bye")
+                        return
+                    else:
+                        self.reply("502 unknown")
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.tcp = Server(("127.0.0.1", 0), Handler)
+        self.port = self.tcp.server_address[1]
+        threading.Thread(target=self.tcp.serve_forever, daemon=True).start()
+
+    def hang_up(self):
+        """Drop every open session, as a server does after its idle timeout."""
+        for handler in self.handlers:
+            handler.connection.shutdown(socket.SHUT_RDWR)
+        self.handlers = []
+
+    def close(self):
+        self.tcp.shutdown()
+        self.tcp.server_close()
+
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPServer()
+    yield server
+    server.close()
+
+
+def make_pool(server, pool_class=SMTPConnectionPool, **kwargs):
+    options = dict(username="user", password="secret", use_tls=False, size=2, timeout=5)
+    options.update(kwargs)
+    return pool_class("127.0.0.1", server.port, **options)
+
+
+def message(to="someone@example.com"):
+    msg = MIMEText("hello")
+    msg["Subject"] = "Test"
+    msg["From"] = "noreply@example.com"
+    msg["To"] = to
+    return msg
+
+
+def test_sessions_are_reused(smtp_server):
+    pool = make_pool(smtp_server)
+    for _ in range(5):
+        pool.send_message(message())
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda _: pool.send_message(message()), range(20)))
+    pool.close()
+    assert len(smtp_server.messages) == 25
+    # Never more sessions than the pool size, each authenticated once
+    assert smtp_server.connections <= 2
+    assert smtp_server.logins == smtp_server.connections
+    assert pool.stats()["sent"] == 25
+
+
+def test_dropped_session_is_replaced(smtp_server):
+    pool = make_pool(smtp_server, size=1)
+    pool.send_message(message())
+    smtp_server.hang_up()
+    pool.send_message(message())
+    pool.close()
+    assert len(smtp_server.messages) == 2
+    assert smtp_server.connections == 2
+    assert pool.stats()["dropped"] == 1
+
+
+def test_idle_sessions_are_checked_and_recycled(smtp_server):
+    pool = make_pool(smtp_server, size=1, keepalive_interval=0)
+    pool.send_message(message())
+    pool.keepalive()
+    assert smtp_server.noops == 1
+    pool.max_age = 0
+    pool.send_message(message())
+    pool.close()
+    assert smtp_server.connections == 2
+    assert pool.stats()["recycled"] == 1
+
+
+def test_rejected_recipient_keeps_session(smtp_server):
+    smtp_server.reject_rcpt.add("nobody@example.com")
+    pool = make_pool(smtp_server, size=1)
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        pool.send_message(message("nobody@example.com"))
+    pool.send_message(message())
+    pool.close()
+    assert smtp_server.connections == 1
+    assert pool.stats()["send_errors"] == 1
+
+
+def test_async_sessions_are_reused(smtp_server):
+    async def run():
+        pool = make_pool(smtp_server, AsyncSMTPConnectionPool)
+        await asyncio.gather(*(pool.send_message(message()) for _ in range(20)))
+        await pool.send_message(message())
+        await pool.close()
+        return pool
+
+    pool = asyncio.run(run())
+    assert len(smtp_server.messages) == 21
+    # Concurrency is capped at the pool size
+    assert smtp_server.connections == 2
+    assert smtp_server.logins == 2
+    assert pool.stats()["sent"] == 21
+
+
+def test_async_dropped_session_is_replaced(smtp_server):
+    async def run():
+        pool = make_pool(smtp_server, AsyncSMTPConnectionPool, size=1)
+        await pool.send_message(message())
+        smtp_server.hang_up()
+        await asyncio.sleep(0.1)
+        await pool.send_message(message())
+        await pool.close()
+        return pool
+
+    pool = asyncio.run(run())
+    assert len(smtp_server.messages) == 2
+    assert smtp_server.connections == 2
+
+
+def test_async_rejected_recipient_keeps_session(smtp_server):
+    smtp_server.reject_rcpt.add("nobody@example.com")
+
+    async def run():
+        pool = make_pool(smtp_server, AsyncSMTPConnectionPool, size=1)
+        results = await pool.send_many([message("nobody@example.com"), message()])
+        await pool.close()
+        return results
+
+    rejected, sent = asyncio.run(run())
+    assert isinstance(rejected, aiosmtplib.SMTPRecipientsRefused)
+    assert rejected.recipients[0].code == 550
+    assert sent is None
+    assert smtp_server.connections == 1
+
+
+def test_async_surplus_session_is_closed_on_checkin(smtp_server):
+    async def run():
+        pool = make_pool(smtp_server, AsyncSMTPConnectionPool, size=1, keepalive_interval=0)
+        await pool.send_message(message())
+        # keepalive holds the idle session, so the send opens a second one
+        await asyncio.gather(pool.keepalive(), pool.send_message(message()))
+        stats = pool.stats()
+        await pool.close()
+        return stats
+
+    stats = asyncio.run(run())
+    assert smtp_server.connections == 2
+    assert stats["idle"] == 1
+    assert stats["recycled"] == 1
+
+
+def test_async_send_timeout_drops_session(smtp_server):
+    smtp_server.data_delay = 0.5
+
+    async def run():
+        pool = make_pool(smtp_server, AsyncSMTPConnectionPool, size=1, send_timeout=0.1)
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.send_message(message())
+        smtp_server.data_delay = 0
+        await pool.send_message(message())
+        await pool.close()
+        return pool
+
+    pool = asyncio.run(run())
+    assert smtp_server.connections == 2
+    assert pool.stats()["dropped"] == 1
@@ -0,0 +1,39 @@
+import time
+import uuid
+import pytest
+from app.core.tokens import (
+    InvalidUserToken, RESET_PASSWORD, VERIFY_EMAIL,
+    create_password_reset_token, create_user_token, create_verification_token, verify_user_token,
+)
+
+
+def test_token_round_trip_carries_user_id_and_version():
+    user_id = uuid.uuid4()
+    token = create_password_reset_token(user_id, "$2b$12$old-hash")
+    claims = verify_user_token(token, RESET_PASSWORD)
+    assert claims.user_id == str(user_id)
+    assert claims.matches("$2b$12$old-hash")
+    # Once the password changes the same link no longer applies
+    assert not claims.matches("$2b$12$new-hash")
+    assert claims.expires_at > time.time()
+
+
+def test_forged_and_malformed_tokens_are_rejected():
+    token = create_verification_token(uuid.uuid4(), "someone@example.com")
+    forged = token[:10] + ("A" if token[10] != "A" else "B") + token[11:]
+    for bad in (forged, token[:-4], "", "not a token!", token + "AAAA"):
+        with pytest.raises(InvalidUserToken):
+            verify_user_token(bad, VERIFY_EMAIL)
+
+
+def test_token_is_bound_to_its_purpose():
+    token = create_verification_token(uuid.uuid4(), "someone@example.com")
+    with pytest.raises(InvalidUserToken):
+        verify_user_token(token, RESET_PASSWORD)
+
+
+def test_expired_tokens_are_rejected():
+    token = create_user_token(uuid.uuid4(), RESET_PASSWORD, "hash", expires_in=60)
+    verify_user_token(token, RESET_PASSWORD)
+    with pytest.raises(InvalidUserToken, match="expired"):
+        verify_user_token(token, RESET_PASSWORD, now=time.time() + 61)
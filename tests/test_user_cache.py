@@ -0,0 +1,53 @@
+import time
+from app.core.cache import TTLCache
+
+
+def test_lru_eviction_and_counters():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["size"]) == (3, 1, 1, 2)
+
+
+def test_entries_expire_after_ttl():
+    cache = TTLCache(maxsize=10, ttl=0.05)
+    cache.set("a", 1)
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_invalidation_discards_reads_that_started_before_it():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    version = cache.version  # a miss path would read the database after this
+    cache.invalidate("a")
+    cache.set("a", "stale", version=version)
+    assert cache.get("a") is None
+    cache.set("a", 2, version=cache.version)
+    assert cache.get("a") == 2
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_zero_size_disables_cache():
+    cache = TTLCache(maxsize=0, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") is None and len(cache) == 0
+
+
+def test_per_entry_ttl_and_weight_cap():
+    cache = TTLCache(maxsize=10, ttl=60, max_weight=100)
+    cache.set("short", 1, ttl=0.05)
+    cache.set("expired", 2, ttl=-1)
+    assert cache.get("expired") is None
+    cache.set("a", 3, weight=60)
+    cache.set("b", 4, weight=60)  # evicts the least recently used until it fits
+    assert cache.get("short") is None and cache.get("a") is None and cache.get("b") == 4
+    assert cache.weight == 60
+    cache.set("huge", 5, weight=101)
+    assert cache.get("huge") is None and cache.get("b") == 4
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.v1.endpoints import users
+from app.models.user import User
+
+
+class FakeTransaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def transaction(self, readonly=False):
+        return FakeTransaction()
+
+
+class FakePool:
+    def __init__(self):
+        self.released = []
+
+    async def release(self, conn):
+        self.released.append(conn)
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    conn, pool = FakeConnection(), FakePool()
+    started = datetime(2024, 1, 1)
+    rows = [
+        {"id": uuid.uuid4(), "email": f"user{i}@example.com", "created_at": started + timedelta(seconds=i)}
+        for i in range(3)
+    ]
+
+    async def lease_read(key=None):
+        return conn, pool
+
+    async def iter_page(db, columns, limit, prefetch=100, **filters):
+        for row in rows[:limit]:
+            yield row
+
+    monkeypatch.setattr(users.db_router, "lease_read", lease_read)
+    monkeypatch.setattr(User, "iter_page", staticmethod(iter_page))
+    return conn, pool
+
+
+@pytest.fixture
+def app():
+    app = FastAPI()
+    app.include_router(users.router)
+    admin = User(uuid.uuid4(), "Ada", "Admin", "admin@example.com", "hash", role="admin")
+    app.dependency_overrides[users.get_current_user] = lambda: admin
+    return app
+
+
+def test_streamed_page_releases_connection(app, fake_db):
+    conn, pool = fake_db
+    response = TestClient(app).get("/", params={"limit": 2, "fields": "id,email"})
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["email"] for item in body["items"]] == ["user0@example.com", "user1@example.com"]
+    assert body["next_cursor"] is not None
+    assert pool.released == [conn]
+
+
+def test_early_disconnect_releases_connection(app, fake_db):
+    conn, pool = fake_db
+    sent = []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # The client is gone before the first byte gets out
+        await asyncio.sleep(0.1)
+        sent.append(message)
+
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "path": "/", "raw_path": b"/",
+        "root_path": "", "scheme": "http", "query_string": b"limit=2", "headers": [],
+        "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+    }
+    asyncio.run(app(scope, receive, send))
+    assert not any(message["type"] == "http.response.body" for message in sent)
+    assert pool.released == [conn]
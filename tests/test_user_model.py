@@ -0,0 +1,89 @@
+import asyncio
+import uuid
+from app.db.statements import statements
+from app.models.user import UPSERT_USER, USER_COLUMNS, User
+
+
+class RecordingConnection:
+    """Stands in for an asyncpg connection and records what `save` runs."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def execute(self, sql, *args):
+        self.calls.append((sql, args))
+        return "UPDATE 1"
+
+
+def new_user(**kwargs) -> User:
+    return User(uuid.uuid4(), "Ada", "Lovelace", "ada@example.com", "hash", **kwargs)
+
+
+def loaded_user() -> User:
+    user = new_user()
+    return User.from_record([getattr(user, column) for column in USER_COLUMNS])
+
+
+def save(user: User) -> RecordingConnection:
+    conn = RecordingConnection()
+    asyncio.run(user.save(conn))
+    return conn
+
+
+def test_new_user_defaults_match_create():
+    user = new_user()
+    assert user.provider == 'email'
+    assert user.role == 'user'
+
+
+def test_new_user_is_upserted_with_every_column():
+    user = new_user()
+    conn = save(user)
+    [(sql, args)] = conn.calls
+    assert sql == statements.sql(UPSERT_USER)
+    assert args[0] == user.id
+    assert None not in (user.provider, user.role)
+    assert user.dirty_fields == frozenset()
+
+
+def test_loaded_user_starts_clean():
+    user = loaded_user()
+    assert user.dirty_fields == frozenset()
+    assert save(user).calls == []
+
+
+def test_only_assigned_columns_are_updated():
+    user = loaded_user()
+    user.last_name = "Byron"
+    user.is_verified = True
+    assert user.dirty_fields == {"last_name", "is_verified"}
+    [(sql, args)] = save(user).calls
+    assert sql.startswith("UPDATE users SET last_name = $1, is_verified = $2, updated_at")
+    assert sql.endswith("WHERE id = $3")
+    assert args == ("Byron", True, user.id)
+    assert user.dirty_fields == frozenset()
+    assert save(user).calls == []
+
+
+def test_columns_are_updated_in_table_order():
+    user = loaded_user()
+    user.provider = "google"
+    user.first_name = "Augusta"
+    [(sql, args)] = save(user).calls
+    assert sql.startswith("UPDATE users SET first_name = $1, provider = $2,")
+    assert args == ("Augusta", "google", user.id)
+
+
+def test_managed_columns_are_not_tracked():
+    user = loaded_user()
+    user.updated_at = None
+    user.id = user.id
+    assert user.dirty_fields == frozenset()
+
+
+def test_saved_new_user_switches_to_updates():
+    user = new_user()
+    save(user)
+    user.email = "ada@example.org"
+    [(sql, args)] = save(user).calls
+    assert sql.startswith("UPDATE users SET email = $1,")